@@ -1,13 +1,18 @@
 import asyncio
 import os
+import signal
 import sys
+import time
+from datetime import datetime, timezone
 
-from aiohttp import ClientSession, ClientTimeout
 from opentelemetry import trace
 
 import skim
 import skim.crawl
 import skim.database
+import skim.dates
+import skim.entries
+import skim.normalize
 import skim.subscriptions
 
 
@@ -20,9 +25,19 @@ def help():
         print('  ', name, '-', function.__doc__)
 
 
+def _run(coroutine):
+    """Runs a coroutine with the database connection pool open for its duration"""
+
+    async def with_pool():
+        async with skim.database.pool():
+            return await coroutine
+
+    return asyncio.run(with_pool())
+
+
 def migrate():
     """Applies migrations to the database"""
-    asyncio.run(skim.database.migrate())
+    _run(skim.database.migrate())
 
 
 def shell():
@@ -44,38 +59,173 @@ def feeds():
         async for subscription in skim.subscriptions.all_subscriptions():
             print(f"{subscription['title']}: {subscription['feed']}")
 
-    asyncio.run(print_feeds())
+    _run(print_feeds())
 
 
 def add_feed():
     """Subscribes to a new feed"""
-    asyncio.run(skim.subscriptions.add(sys.argv[2]))
+    _run(skim.subscriptions.add(sys.argv[2]))
 
 
 def remove_feed():
     """Unsubscribes from a feed"""
-    asyncio.run(skim.subscriptions.remove(sys.argv[2]))
+    _run(skim.subscriptions.remove(sys.argv[2]))
 
 
 def fetch():
-    asyncio.run(skim.crawl.fetch(sys.argv[2]))
+    """Fetches and prints a feed without saving anything"""
 
+    async def fetch_feed():
+        async with skim.crawl.client_session() as session:
+            _, _, feed, entries = await skim.crawl.fetch(session, sys.argv[2])
 
-def crawl():
-    """Runs one full crawl"""
-    asyncio.run(skim.crawl.crawl())
-    asyncio.run(post_crawl_webhook())
+        if not feed:
+            return
+
+        # simpler
+        print(skim.normalize.feed(feed)['title'])
+        for entry in skim.normalize.entries(entries):
+            print(entry['timestamp'], entry['title'], 'by:', entry['creators'])
 
+        # # verbose
+        # import pprint
+        # pprint.pprint(feed)
+        # pprint.pprint(skim.normalize.feed(feed))
+        # print(f'--- {len(entries)} entries ---')
+        # for entry in entries:
+        #     pprint.pprint(entry)
+        #     pprint.pprint(skim.normalize.entry(entry))
 
-async def post_crawl_webhook():
-    webhook = os.environ.get('SKIM_POST_CRAWL_WEBHOOK')
-    if not webhook:
-        return
+    _run(fetch_feed())
 
-    print('Pinging webhook...')
-    async with ClientSession(timeout=ClientTimeout(total=30)) as session:
-        async with session.get(webhook) as response:
-            print(response.status, await response.content.read())
+
+def crawl():
+    """Crawls every feed that is due"""
+
+    async def crawl_and_notify():
+        await skim.crawl.crawl()
+        await skim.crawl.post_crawl_webhook()
+
+    _run(crawl_and_notify())
+
+
+def crawld():
+    """Keeps crawling feeds as they come due, until stopped"""
+
+    async def crawl_until_stopped():
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stopping.set)
+
+        await skim.crawl.crawl_continuously(stopping)
+
+    _run(crawl_until_stopped())
+
+
+def prune():
+    """Drops the months of entries older than the retention window"""
+
+    async def prune_entries():
+        before = skim.dates.utcnow() - skim.entries.RETENTION
+        for month in await skim.entries.prune(before):
+            print('Dropped entries from', month.strftime('%B %Y'))
+
+    _run(prune_entries())
+
+
+def benchmark():
+    """Times filtered timeline pages as synthetic entries pile up"""
+    sizes = [int(size) for size in sys.argv[2:]] or [10_000, 100_000, 1_000_000]
+    feed = 'https://benchmark.invalid/feed/'
+    filters = {
+        'unfiltered': {},
+        'feed': {'feed': f'{feed}7'},
+        'creator': {'creator': 'Creator 7'},
+        'category': {'category': 'Category 7'},
+        'creator and category': {'creator': 'Creator 7', 'category': 'Category 7'},
+        'search': {'q': 'entry 7'},
+    }
+
+    async def seed(db, start, stop):
+        # 100 feeds, 1,000 creators and 200 categories, one entry per minute
+        await db.execute(
+            """
+            SELECT  create_entries_partition(
+                        '2000-01-01'::timestamptz + n * INTERVAL '1 day'
+                    )
+            FROM    generate_series($1::bigint / 1440, $2::bigint / 1440) AS n
+            """,
+            start,
+            stop,
+        )
+        await db.execute(
+            """
+            INSERT INTO entries (feed, id, timestamp, title, body)
+            SELECT  $1 || (n % 100),
+                    n::text,
+                    '2000-01-01'::timestamptz + n * INTERVAL '1 minute',
+                    'Entry ' || n,
+                    repeat('Lorem ipsum dolor sit amet. ', 40)
+            FROM    generate_series($2::bigint, $3::bigint - 1) AS n
+            """,
+            feed,
+            start,
+            stop,
+        )
+        for table, column, values in [
+            ('entry_creators', 'creator', 1_000),
+            ('entry_categories', 'category', 200),
+        ]:
+            await db.execute(
+                f"""
+                INSERT INTO {table} (feed, id, timestamp, {column})
+                SELECT  $1 || (n % 100),
+                        n::text,
+                        '2000-01-01'::timestamptz + n * INTERVAL '1 minute',
+                        '{column.title()} ' || (n % $4)
+                FROM    generate_series($2::bigint, $3::bigint - 1) AS n
+                """,
+                feed,
+                start,
+                stop,
+                values,
+            )
+        await db.execute('ANALYZE entries, entry_creators, entry_categories')
+
+    async def page_times(filter):
+        """Times the first page and the fifth page of a filter"""
+        timings = []
+        position = datetime.max.replace(tzinfo=timezone.utc)
+        for _ in range(5):
+            start = time.perf_counter()
+            page = [e async for e in skim.entries.older_than(position, filter)]
+            timings.append(time.perf_counter() - start)
+            if not page:
+                break
+            position = skim.entries.position(page[-1])
+        return timings[0], timings[-1]
+
+    async def run_benchmark():
+        seeded = 0
+        try:
+            for size in sizes:
+                async with skim.database.connection() as db:
+                    await seed(db, seeded, size)
+                seeded = size
+
+                print(f'--- {size:,} entries ---')
+                for name, filter in filters.items():
+                    first, fifth = await page_times(filter)
+                    print(
+                        f'{name:>24}: first page {first * 1000:7.1f}ms, '
+                        f'fifth page {fifth * 1000:7.1f}ms'
+                    )
+        finally:
+            async with skim.database.connection() as db:
+                await db.execute("DELETE FROM entries WHERE feed LIKE $1 || '%'", feed)
+
+    _run(run_benchmark())
 
 
 available_commands = {
@@ -11,12 +11,12 @@ async def top_categories_by_month():
         by_month AS (
             SELECT  DATE_TRUNC('month', timestamp) as month,
                     category,
-                    COUNT(DISTINCT entries.id) as entries
-            FROM    entries
-                    INNER JOIN entry_categories
-                            ON entry_categories.feed = entries.feed AND
-                            entry_categories.id = entries.id
-            WHERE   category NOT IN ('Uncategorized', 'post')
+                    COUNT(DISTINCT id) as entries
+            FROM    entry_categories
+            WHERE   category NOT IN ('Uncategorized', 'post') AND
+                    timestamp >= (
+                        DATE_TRUNC('month', CURRENT_TIMESTAMP) - INTERVAL '1 year'
+                    )
             GROUP BY month, category
             ORDER BY month DESC, entries DESC
         ),
@@ -35,8 +35,7 @@ async def top_categories_by_month():
                 category,
                 entries
         FROM    ranked
-        WHERE   rank <= 20 AND
-                month >= (DATE_TRUNC('month', CURRENT_TIMESTAMP) - INTERVAL '1 year')
+        WHERE   rank <= 20
         ORDER BY month DESC, entries DESC
         ;
         """
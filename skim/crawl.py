@@ -1,11 +1,37 @@
 import asyncio
+import hashlib
 import logging
 import os
+import random
+import re
+import time
+import zlib
+from datetime import timedelta, timezone
+from email.utils import parsedate_to_datetime
 
-from aiohttp import ClientConnectionError, ClientSession, ClientTimeout
+import async_timeout
+import brotli
+from aiohttp import (
+    ClientConnectionError,
+    ClientPayloadError,
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+    TraceConfig,
+)
 from opentelemetry import metrics, trace
 
-from skim import entries, normalize, parse, subscriptions
+from skim import (
+    database,
+    dates,
+    entries,
+    normalize,
+    parse,
+    processing,
+    schedule,
+    seen,
+    subscriptions,
+)
 
 logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
@@ -14,124 +40,704 @@ meter = metrics.get_meter(__name__)  # type: ignore
 new_entries_counter = meter.create_counter(
     'new_entries', '{entries}', 'The number of new entries crawled'
 )
+feed_crawl_duration = meter.create_histogram(
+    'feed_crawl_duration', 's', 'The time taken to fetch and save one feed'
+)
+crawl_duration = meter.create_histogram(
+    'crawl_duration', 's', 'The wall-clock time taken by a full crawl'
+)
+feed_bytes_received = meter.create_counter(
+    'feed_bytes_received', 'By', 'The bytes of feeds received, as sent over the wire'
+)
+feed_bytes_decoded = meter.create_counter(
+    'feed_bytes_decoded', 'By', 'The bytes of feeds received, once decompressed'
+)
+queue_depth = meter.create_up_down_counter(
+    'crawl_queue_depth', '{feeds}', 'The feeds waiting on each stage of a crawl'
+)
 
 MAX_CONCURRENT = int(os.getenv('SKIM_CRAWL_CONCURRENCY') or '8') or 8
+MAX_CONCURRENT_PER_HOST = int(os.getenv('SKIM_CRAWL_CONCURRENCY_PER_HOST') or '2')
+DNS_CACHE_TTL = int(os.getenv('SKIM_CRAWL_DNS_CACHE_TTL') or '300')
+KEEPALIVE_TIMEOUT = float(os.getenv('SKIM_CRAWL_KEEPALIVE_TIMEOUT') or '30')
+TIMEOUT = float(os.getenv('SKIM_CRAWL_TIMEOUT') or '5') or 5
+TOTAL_TIMEOUT = float(os.getenv('SKIM_CRAWL_TOTAL_TIMEOUT') or '60') or 60
+POLL_INTERVAL = float(os.getenv('SKIM_CRAWLD_POLL_INTERVAL') or '60')
+WEBHOOK_INTERVAL = float(os.getenv('SKIM_POST_CRAWL_WEBHOOK_INTERVAL') or '900')
+PRUNE_INTERVAL = float(os.getenv('SKIM_CRAWLD_PRUNE_INTERVAL') or '3600')
+LEASE = timedelta(seconds=int(os.getenv('SKIM_CRAWL_LEASE') or '300'))
+READ_CHUNK_SIZE = int(os.getenv('SKIM_CRAWL_READ_CHUNK_SIZE') or '65536')
+
+# how many feeds can wait between the stages of a crawl before the earlier stage
+# has to wait, and how many of them the writer saves in each transaction
+QUEUE_SIZE = int(os.getenv('SKIM_CRAWL_QUEUE_SIZE') or '16') or 16
+WRITE_BATCH_SIZE = int(os.getenv('SKIM_CRAWL_WRITE_BATCH_SIZE') or '32') or 32
+
+# the writer holds back crawl_log rows until it has this many of them, or until
+# this many seconds have passed since it last wrote them
+CRAWL_LOG_BATCH_SIZE = int(os.getenv('SKIM_CRAWL_LOG_BATCH_SIZE') or '500')
+CRAWL_LOG_INTERVAL = float(os.getenv('SKIM_CRAWL_LOG_FLUSH_INTERVAL') or '30')
+
+# requests to each host are limited to a sustained rate (per second), with up to
+# a burst of them allowed at once
+HOST_RATE = float(os.getenv('SKIM_CRAWL_HOST_RATE') or '1')
+HOST_BURST = float(os.getenv('SKIM_CRAWL_HOST_BURST') or '2')
+
+# transient failures are retried a few times within a crawl, with jittered
+# exponential backoff (in seconds) starting at RETRY_DELAY
+RETRIES = int(os.getenv('SKIM_CRAWL_RETRIES') or '2')
+RETRY_DELAY = float(os.getenv('SKIM_CRAWL_RETRY_DELAY') or '1')
+MAX_RETRY_DELAY = float(os.getenv('SKIM_CRAWL_MAX_RETRY_DELAY') or '30')
+
+
+def client_session():
+    """Creates the HTTP session shared by all of the fetches in a crawl, so that
+    feeds on the same host reuse connections and DNS lookups"""
+    connector = TCPConnector(
+        limit=MAX_CONCURRENT,
+        limit_per_host=MAX_CONCURRENT_PER_HOST,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+    )
+    # time spent waiting for a free connection to a busy host shouldn't count
+    # against a feed, so the session only limits the connect and read phases,
+    # and request_deadline limits each request once it has its connection
+    timeout = ClientTimeout(total=None, sock_connect=TIMEOUT, sock_read=TIMEOUT)
+    trace_configs = [host_limiter(HOST_RATE, HOST_BURST)] if HOST_RATE else []
+    trace_configs.append(request_deadline(TOTAL_TIMEOUT))
+    # fetch decompresses bodies itself, so it can count the bytes on the wire
+    return ClientSession(
+        connector=connector,
+        timeout=timeout,
+        trace_configs=trace_configs,
+        auto_decompress=False,
+    )
+
+
+def request_deadline(total):
+    """Starts the clock on a request's overall timeout, passed in as its
+    trace_request_ctx, once it has a connection, so a server trickling out a
+    feed can't hold on to a crawler for longer than `total` seconds"""
+
+    async def start_the_clock(session, context, params):
+        deadline = context.trace_request_ctx
+        # redirects get a connection of their own, but share the one deadline
+        if deadline is not None and deadline.deadline is None:
+            deadline.update(asyncio.get_running_loop().time() + total)
+
+    deadline = TraceConfig()
+    deadline.on_connection_create_start.append(start_the_clock)
+    deadline.on_connection_reuseconn.append(start_the_clock)
+    return deadline
+
+
+def host_limiter(rate, burst):
+    """Keeps a token bucket for each host, holding requests back until the host
+    has a token for them, so no host sees more than a burst of requests at once
+    or more than `rate` of them a second over time"""
+    buckets: dict[str, tuple[float, float]] = {}
+
+    async def wait_for_a_token(session, context, params):
+        host = params.url.host
+        while True:
+            now = time.monotonic()
+            tokens, updated = buckets.get(host, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                buckets[host] = (tokens - 1, now)
+                return
+            buckets[host] = (tokens, now)
+            await asyncio.sleep((1 - tokens) / rate)
+
+    limiter = TraceConfig()
+    limiter.on_request_start.append(wait_for_a_token)
+    return limiter
 
 
 async def crawl():
-    to_fetch = [
-        subscription async for subscription in subscriptions.all_subscriptions()
-    ]
-    while to_fetch:
-        batch, to_fetch = to_fetch[:MAX_CONCURRENT], to_fetch[MAX_CONCURRENT:]
-        results = await asyncio.gather(
-            *[fetch_and_save(subscription) for subscription in batch],
-            return_exceptions=True,
-        )
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                subscription = batch[i]
-                logger.warning('Exception crawling %s: %r', subscription, result)
+    started = time.monotonic()
+
+    claimed: asyncio.Queue = asyncio.Queue()
+    claiming = asyncio.Lock()
+
+    async def next_subscription():
+        return await next_claimed(claimed, claiming, MAX_CONCURRENT)
+
+    with processing.pool():
+        async with client_session() as session:
+            await pipeline(session, next_subscription)
+
+    await prune_crawls()
+
+    crawl_duration.record(time.monotonic() - started)
+
+
+async def prune_crawls():
+    """Deletes the crawl history that has aged out, keeping the raw crawls for at
+    least as long as scheduling looks back over them"""
+    now = dates.utcnow()
+    retention = max(subscriptions.CRAWL_LOG_RETENTION, schedule.LOOKBACK)
+    await subscriptions.prune_crawls(
+        now - retention, now - subscriptions.ROLLUP_RETENTION
+    )
+
+
+async def next_claimed(claimed, claiming, batch_size):
+    """Hands out the next of the subscriptions leased to this crawler, leasing
+    another batch of due feeds once they've all been handed out"""
+    async with claiming:
+        if claimed.empty():
+            for subscription in await subscriptions.claim(batch_size, LEASE):
+                claimed.put_nowait(subscription)
+        return None if claimed.empty() else claimed.get_nowait()
 
 
-async def fetch_and_save(subscription):
-    with tracer.start_as_current_span('fetch_and_save') as span:
+async def crawl_continuously(stopping: asyncio.Event):
+    """Keeps crawling feeds as they come due until `stopping` is set, then lets
+    the feeds that are already being fetched finish"""
+    claimed: asyncio.Queue = asyncio.Queue()
+    claiming = asyncio.Lock()
+    crawled = 0
+    # the entry ids already stored for each feed, which the daemon keeps so
+    # that recrawling an unchanged feed doesn't need to ask the database
+    known: dict[str, set[int]] = {}
+
+    async def next_subscription():
+        while not stopping.is_set():
+            try:
+                # leasing one feed at a time means nothing is left claimed but
+                # unstarted when the daemon stops
+                subscription = await next_claimed(claimed, claiming, 1)
+            except Exception:
+                logger.exception('Unable to claim the feeds that are due')
+                subscription = None
+
+            if subscription:
+                return subscription
+
+            await wait_until_stopping(stopping, POLL_INTERVAL)
+        return None
+
+    def saved(count):
+        nonlocal crawled
+        crawled += count
+
+    with processing.pool():
+        async with client_session() as session:
+            crawling = asyncio.create_task(
+                pipeline(session, next_subscription, known, saved)
+            )
+
+            last_webhook = last_pruned = time.monotonic()
+            while not stopping.is_set():
+                await wait_until_stopping(stopping, POLL_INTERVAL)
+                if crawled and time.monotonic() - last_webhook >= WEBHOOK_INTERVAL:
+                    crawled, last_webhook = 0, time.monotonic()
+                    await post_crawl_webhook_safely()
+                if time.monotonic() - last_pruned >= PRUNE_INTERVAL:
+                    last_pruned = time.monotonic()
+                    try:
+                        await prune_crawls()
+                    except Exception:
+                        logger.exception('Unable to prune the crawl history')
+
+            await crawling
+
+    if crawled:
+        await post_crawl_webhook_safely()
+
+
+async def post_crawl_webhook_safely():
+    """Posts the webhook from the daemon, which shouldn't go down along with
+    whatever is listening to it"""
+    try:
+        await post_crawl_webhook()
+    except Exception:
+        logger.exception('Unable to post the crawl webhook')
+
+
+async def wait_until_stopping(stopping, timeout):
+    try:
+        await asyncio.wait_for(stopping.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def pipeline(session, next_subscription, known=None, saved=None):
+    """Crawls subscriptions through three stages, each with its own workers:
+    MAX_CONCURRENT downloading feeds, one per process parsing and normalizing
+    them, and a single writer saving whatever has piled up for it in one
+    transaction.  The queues between the stages are bounded, so a stage that
+    falls behind holds back the ones before it.  Runs until next_subscription
+    returns None to every downloader."""
+    to_parse: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+    to_save: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+    parsers = max(processing.PROCESSES, 1)
+
+    async def downloader():
+        # each downloader picks up the next feed as soon as it has handed off
+        # its last one, so one slow feed only ever occupies a single slot
+        while subscription := await next_subscription():
+            try:
+                crawled = await download_feed(session, subscription)
+            except Exception as e:
+                logger.warning('Exception crawling %s: %r', subscription['feed'], e)
+                # the failure is still saved, so the feed is logged, backed off
+                # and released like any other
+                crawled = new_crawl(subscription)
+            await enqueue(to_parse, 'parse', crawled)
+
+    async def parser():
+        while crawled := await dequeue(to_parse, 'parse'):
+            try:
+                await parse_feed(crawled, known)
+            except Exception as e:
+                logger.warning('Exception crawling %s: %r', crawled['feed_url'], e)
+                crawled.update(status=-1, feed=None, entries=[], unchanged=False)
+            await enqueue(to_save, 'save', crawled)
+
+    async def writer():
+        # crawl_log rows are the bulk of a crawl's writes, so they're held back
+        # and written together every so often, and once more at the end
+        unlogged: list[dict] = []
+        flushed = time.monotonic()
+        finished = False
+        while not finished:
+            timeout = flushed + CRAWL_LOG_INTERVAL - time.monotonic()
+            try:
+                batch = [
+                    await asyncio.wait_for(
+                        dequeue(to_save, 'save'),
+                        timeout=max(timeout, 0) if unlogged else None,
+                    )
+                ]
+            except asyncio.TimeoutError:
+                batch = []
+            while batch and len(batch) < WRITE_BATCH_SIZE and not to_save.empty():
+                batch.append(await dequeue(to_save, 'save'))
+            if None in batch:
+                finished = True
+                batch.remove(None)
+            if batch:
+                await save_all(batch, known, unlogged)
+                if saved:
+                    saved(len(batch))
+
+            if unlogged and (
+                finished
+                or len(unlogged) >= CRAWL_LOG_BATCH_SIZE
+                or time.monotonic() - flushed >= CRAWL_LOG_INTERVAL
+            ):
+                await flush_crawl_log(unlogged)
+                flushed = time.monotonic()
+
+    writing = asyncio.create_task(writer())
+    parsing = asyncio.gather(*[parser() for _ in range(parsers)])
+    await asyncio.gather(*[downloader() for _ in range(MAX_CONCURRENT)])
+    for _ in range(parsers):
+        await enqueue(to_parse, 'parse', None)
+    await parsing
+    await enqueue(to_save, 'save', None)
+    await writing
+
+
+async def enqueue(queue, stage, item):
+    await queue.put(item)
+    queue_depth.add(1, {'crawl.stage': stage})
+
+
+async def dequeue(queue, stage):
+    item = await queue.get()
+    queue_depth.add(-1, {'crawl.stage': stage})
+    return item
+
+
+async def post_crawl_webhook():
+    webhook = os.environ.get('SKIM_POST_CRAWL_WEBHOOK')
+    if not webhook:
+        return
+
+    print('Pinging webhook...')
+    async with ClientSession(timeout=ClientTimeout(total=30)) as session:
+        async with session.get(webhook) as response:
+            print(response.status, await response.content.read())
+
+
+def new_crawl(subscription):
+    """What the stages of a crawl know about a subscription before it has been
+    downloaded, which is saved as a failure if nothing more is found out"""
+    return {
+        'feed_url': subscription['feed'],
+        'caching': subscription['caching'],
+        'started': time.monotonic(),
+        'crawled': dates.utcnow(),
+        'response': None,
+        'body': None,
+        'status': -1,
+        'content_type': None,
+        'not_before': None,
+        'feed': None,
+        'entries': [],
+        'unchanged': False,
+    }
+
+
+async def download_feed(session, subscription):
+    """The network stage, which downloads a subscription's feed and notes how
+    the request went for the later stages"""
+    with tracer.start_as_current_span('download_feed') as span:
         feed_url = subscription['feed']
         span.set_attributes({'feed.url': feed_url})
+        crawled = new_crawl(subscription)
         try:
-            feed_url, response, feed, feed_entries = await fetch(
-                feed_url, caching=subscription['caching']
+            _, response, body = await fetch_with_retries(
+                session, feed_url, caching=subscription['caching']
             )
-            status = response.status
-        except (asyncio.TimeoutError, ClientConnectionError):
-            feed = None
-            status = -1
-        except parse.ParseError:
-            feed = None
-            status = -1
+        except (asyncio.TimeoutError, ClientConnectionError, ClientPayloadError):
+            return crawled
         except Exception:
             print(f'Unhandled exception while crawling {feed_url}')
             raise
 
-        span.set_attributes({'feed.status': status})
+        span.set_attributes({'feed.status': response.status})
+        crawled.update(
+            response=response,
+            body=body,
+            status=response.status,
+            not_before=cacheable_until(response.headers, dates.utcnow()),
+        )
+        return crawled
+
+
+async def parse_feed(crawled, known=None):
+    """The CPU stage, which parses a downloaded feed and normalizes whichever of
+    its entries haven't been seen before"""
+    body, crawled['body'] = crawled['body'], None
+    if body is None:
+        return
 
-        if not feed:
-            print(f"Status {status} for {feed_url}")
-            await subscriptions.log_crawl(feed_url, status=status)
+    with tracer.start_as_current_span('parse_feed') as span:
+        feed_url = crawled['feed_url']
+        response = crawled['response']
+        span.set_attributes({'feed.url': feed_url})
+        try:
+            feed, feed_entries = await parse_download(
+                response, body, caching=crawled['caching']
+            )
+        except parse.ParseError:
+            crawled['status'] = -1
             return
 
-        feed = normalize.feed(feed)
-        await subscriptions.update(feed_url, **feed)
+        crawled['content_type'] = response.content_type
 
-        new_entries = await entries.add_all(
-            feed_url, map(normalize.entry, feed_entries)
-        )
+        if feed.get('skim:unchanged'):
+            span.set_attributes({'feed.unchanged': True})
+            crawled['unchanged'] = True
+            return
 
-        span.set_attributes({'feed.new_entries': new_entries})
-        new_entries_counter.add(new_entries, {'feed.url': feed_url})
+        crawled['feed'] = normalize.feed(feed)
 
-        await subscriptions.log_crawl(
-            feed_url,
-            status=response.status,
-            content_type=response.content_type,
-            new_entries=new_entries,
+        # most entries in a feed have been seen before, so only the new ones are
+        # worth the cost of normalizing
+        ids = [normalize.entry_id(entry) for entry in feed_entries]
+        if known is None:
+            unseen = await entries.unseen(feed_url, ids)
+        else:
+            unseen = await seen.unseen(known, feed_url, ids)
+        unseen_entries = [e for i, e in zip(ids, feed_entries) if i in unseen]
+        if unseen_entries:
+            unseen_entries = await processing.run(normalize.entries, unseen_entries)
+        crawled['entries'] = unseen_entries
+
+
+async def save_all(batch, known=None, unlogged=None):
+    """The database stage, which saves what a batch of crawls found in a single
+    transaction, falling back to saving them one at a time if that fails so that
+    one bad feed can't lose the rest of the batch.  Their crawl_log rows are
+    written along with them, unless there's an `unlogged` list to hold them for
+    flush_crawl_log."""
+    try:
+        await save(batch, known, unlogged)
+    except Exception as e:
+        if len(batch) == 1:
+            logger.warning('Exception crawling %s: %r', batch[0]['feed_url'], e)
+            return
+        for crawled in batch:
+            await save_all([crawled], known, unlogged)
+
+
+async def save(batch, known=None, unlogged=None):
+    with tracer.start_as_current_span('save') as span:
+        span.set_attributes({'crawl.batch_size': len(batch)})
+        logged = []
+        async with database.connection() as db, db.transaction():
+            found = {}
+            for crawled in batch:
+                if crawled['feed']:
+                    feed_url = crawled['feed_url']
+                    await subscriptions.update(feed_url, **crawled['feed'], db=db)
+                    found[feed_url] = crawled['entries']
+
+            # which of the batch's entries are already stored is looked up for
+            # all of its feeds at once
+            new_entries = await entries.add_many(found, db=db)
+            for crawled in batch:
+                crawled['new_entries'] = new_entries.get(crawled['feed_url'])
+                if crawled['unchanged']:
+                    crawled['new_entries'] = 0
+                logged.append({**crawled, 'feed': crawled['feed_url']})
+
+            if unlogged is None:
+                await subscriptions.log_crawls(logged, db=db)
+                pending = []
+            else:
+                pending = unlogged + logged
+
+            for crawled in batch:
+                feed_url = crawled['feed_url']
+                await schedule.reschedule(
+                    feed_url,
+                    not_before=crawled['not_before'],
+                    db=db,
+                    unlogged=[crawl for crawl in pending if crawl['feed'] == feed_url],
+                )
+
+        if unlogged is not None:
+            unlogged.extend(logged)
+
+    for crawled in batch:
+        feed_url = crawled['feed_url']
+        if crawled['unchanged']:
+            print(f"Unchanged since the last crawl of {feed_url}")
+        elif not crawled['feed']:
+            print(f"Status {crawled['status']} for {feed_url}")
+        else:
+            new_entries = crawled['new_entries']
+            if known is not None:
+                ids = [entry['id'] for entry in crawled['entries']]
+                seen.remember(known, feed_url, ids)
+            new_entries_counter.add(new_entries, {'feed.url': feed_url})
+        feed_crawl_duration.record(
+            time.monotonic() - crawled['started'], {'feed.url': feed_url}
         )
 
 
-async def fetch(feed_url, caching=None):
+async def flush_crawl_log(unlogged):
+    """Writes out the crawl_log rows held back by the writer, keeping them for
+    the next flush if the database isn't taking them right now"""
+    try:
+        await subscriptions.log_crawls(unlogged)
+    except Exception:
+        logger.exception('Unable to write %s crawls to the crawl log', len(unlogged))
+        return
+    unlogged.clear()
+
+
+async def fetch_with_retries(session, feed_url, caching=None):
+    """Downloads a feed, retrying timeouts, dropped connections, and responses that
+    say to try again later (429s and 5xxs) a few times with backoff"""
+    attempt = 0
+    while True:
+        last_attempt = attempt >= RETRIES
+        try:
+            fetched = await download(session, feed_url, caching=caching)
+        except (asyncio.TimeoutError, ClientConnectionError):
+            if last_attempt:
+                raise
+            delay = backoff(attempt)
+        else:
+            response = fetched[1]
+            if last_attempt or not transient(response.status):
+                return fetched
+            delay = retry_delay(response.headers, attempt)
+            if delay is None:
+                return fetched
+
+        logger.info('Retrying %s in %.1fs', feed_url, delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def transient(status):
+    return status == 429 or 500 <= status < 600
+
+
+def backoff(attempt):
+    """Full jitter, so crawlers retrying the same host don't all come back at
+    the same moment"""
+    return random.uniform(0, min(RETRY_DELAY * 2**attempt, MAX_RETRY_DELAY))
+
+
+def retry_delay(headers, attempt):
+    """How long to wait before retrying a response, or None if its Retry-After
+    is further out than is worth waiting for in this crawl"""
+    retry_after = (headers.get('Retry-After') or '').strip()
+    if retry_after.isdigit():
+        delay = float(retry_after)
+    elif retry_at := http_date(retry_after):
+        delay = max(0, (retry_at - dates.utcnow()).total_seconds())
+    else:
+        return backoff(attempt)
+    return delay if delay <= MAX_RETRY_DELAY else None
+
+
+async def fetch(session, feed_url, caching=None):
+    feed_url, response, body = await download(session, feed_url, caching=caching)
+    if body is None:
+        return feed_url, response, None, None
+
+    feed, entries = await parse_download(response, body, caching=caching)
+    return feed_url, response, feed, entries
+
+
+async def download(session, feed_url, caching=None):
+    """Requests a feed, returning its decompressed body, or None when there's
+    nothing new to parse"""
     headers = only_set(
         {
             'User-Agent': 'skim/0',
+            'Accept-Encoding': 'gzip, deflate, br',
             'If-None-Match': caching and caching.get('Etag'),
             'If-Modified-Since': caching and caching.get('Last-Modified'),
         }
     )
-    timeout = ClientTimeout(total=5)
-    async with ClientSession(timeout=timeout) as session:
-        async with session.get(feed_url, headers=headers) as response:
-            print(f'--- {feed_url} ({response.status}) ---')
+    async with async_timeout.timeout(None) as deadline, session.get(
+        feed_url, headers=headers, trace_request_ctx=deadline
+    ) as response:
+        print(f'--- {feed_url} ({response.status}) ---')
 
-            if response.status == 304:
-                return feed_url, response, None, None
+        if response.status == 304:
+            return feed_url, response, None
 
-            if response.status != 200:
-                print(
-                    'TODO: Error status codes',
-                    feed_url,
-                    response.status,
-                    response.headers,
-                )
-                return feed_url, response, None, None
+        if response.status != 200:
+            print(
+                'TODO: Error status codes',
+                feed_url,
+                response.status,
+                response.headers,
+            )
+            return feed_url, response, None
 
-            print(f'Content: {response.content_type} {response.charset}')
+        print(f'Content: {response.content_type} {response.charset}')
 
-            feed, entries = await parse.parse(
-                response.content_type, response.charset, response.content
-            )
+        body = await read_body(response)
 
-            feed['skim:caching'] = only_set(
-                {
-                    'Etag': response.headers.get('Etag'),
-                    'Last-Modified': response.headers.get('Last-Modified'),
-                }
-            )
+    return feed_url, response, body
 
-        # simpler
-        print(normalize.feed(feed)['title'])
-        for entry in entries:
-            entry = normalize.entry(entry)
-            print(entry['timestamp'], entry['title'], 'by:', entry['creators'])
-
-        # # verbose
-        # import pprint
-        # pprint.pprint(feed)
-        # pprint.pprint(normalize.feed(feed))
-        # print(f'--- {len(entries)} entries ---')
-        # for entry in entries:
-        #     pprint.pprint(entry)
-        #     pprint.pprint(normalize.entry(entry))
 
-    return feed_url, response, feed, entries
+async def parse_download(response, body, caching=None):
+    """Parses a downloaded feed in the process pool"""
+    validators = {
+        'Etag': response.headers.get('Etag'),
+        'Last-Modified': response.headers.get('Last-Modified'),
+    }
+
+    # plenty of feeds don't support conditional requests, but still send
+    # exactly the same document until something changes; feeds that do are
+    # parsed, so that validators they've changed are stored for next time
+    digest = hashlib.sha256(body).hexdigest()
+    if not any(validators.values()):
+        if caching and caching.get('Body-Digest') == digest:
+            return {'skim:unchanged': True}, None
+
+    feed, entries = await processing.run(
+        parse.parse_bytes, response.content_type, response.charset, body
+    )
+
+    feed['skim:caching'] = only_set({**validators, 'Body-Digest': digest})
+    return feed, entries
+
+
+async def read_body(response):
+    """Reads a response's body as it arrives, decompressing each chunk as it
+    comes in rather than waiting for the whole of it"""
+    decompress, flush = decoder(response.headers.get('Content-Encoding'))
+    received = 0
+    decoded = []
+    try:
+        async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+            received += len(chunk)
+            decoded.append(decompress(chunk))
+        decoded.append(flush())
+    except (zlib.error, brotli.error) as e:
+        raise ClientPayloadError(f'Unable to decompress {response.url}: {e!r}')
+
+    body = b''.join(decoded)
+
+    attributes = {'feed.url': str(response.url)}
+    feed_bytes_received.add(received, attributes)
+    feed_bytes_decoded.add(len(body), attributes)
+    return body
+
+
+def decoder(content_encoding):
+    """Returns functions to decompress each chunk of a body sent with the given
+    Content-Encoding, and to flush out whatever is left at the end"""
+    match (content_encoding or 'identity').strip().lower():
+        case 'identity':
+            return bytes, bytes
+        case 'gzip' | 'x-gzip':
+            gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            return gunzip.decompress, gunzip.flush
+        case 'deflate':
+            return inflater()
+        case 'br':
+            unbrotli = brotli.Decompressor()
+            return unbrotli.process, bytes
+        case _:
+            raise ClientPayloadError(f'Unsupported Content-Encoding {content_encoding}')
+
+
+def inflater():
+    """Decompresses deflate bodies, which are meant to be zlib-wrapped, but
+    which some servers send raw, telling the two apart by the first chunk"""
+    inflate = None
+
+    def decompress(chunk):
+        nonlocal inflate
+        if inflate is None:
+            inflate = zlib.decompressobj()
+            try:
+                return inflate.decompress(chunk)
+            except zlib.error:
+                inflate = zlib.decompressobj(-zlib.MAX_WBITS)
+        return inflate.decompress(chunk)
+
+    def flush():
+        return inflate.flush() if inflate else b''
+
+    return decompress, flush
+
+
+def cacheable_until(headers, now):
+    """Works out the earliest time the response's Cache-Control, Expires and
+    Retry-After headers allow for fetching the feed again"""
+    candidates = []
+
+    cache_control = headers.get('Cache-Control') or ''
+    if max_age := re.search(r'(?:^|[\s,])max-age=(\d+)', cache_control):
+        candidates.append(now + timedelta(seconds=int(max_age.group(1))))
+    elif expires := http_date(headers.get('Expires')):
+        candidates.append(expires)
+
+    retry_after = (headers.get('Retry-After') or '').strip()
+    if retry_after.isdigit():
+        candidates.append(now + timedelta(seconds=int(retry_after)))
+    elif retry_at := http_date(retry_after):
+        candidates.append(retry_at)
+
+    return max(candidates, default=None)
+
+
+def http_date(value):
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    # dates given as "-0000" have no timezone, but HTTP dates are always GMT
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
 
 
 def only_set(d):
@@ -11,9 +11,22 @@ MIGRATIONS_BASE = '/skim/skim/migrations/'
 
 tracer = trace.get_tracer(__name__)
 
+_pool = None
+
 
 @asynccontextmanager
-async def connection():
+async def connection(db=None):
+    """Yields a connection from the pool, or `db` itself when given one, so that
+    several writes can share their caller's connection and transaction"""
+    if db:
+        yield db
+        return
+
+    if _pool:
+        async with _pool.acquire() as db:
+            yield db
+        return
+
     db = await asyncpg.connect(**connection_parameters())
     try:
         yield db
@@ -21,6 +34,31 @@ async def connection():
         await db.close()
 
 
+async def open_pool():
+    global _pool
+    if not _pool:
+        _pool = await asyncpg.create_pool(
+            **connection_parameters(), **pool_parameters()
+        )
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool:
+        await pool.close()
+
+
+@asynccontextmanager
+async def pool():
+    await open_pool()
+    try:
+        yield
+    finally:
+        await close_pool()
+
+
 def connection_parameters():
     return {
         'host': os.environ['DB_HOST'],
@@ -31,6 +69,16 @@ def connection_parameters():
     }
 
 
+def pool_parameters():
+    return {
+        'min_size': int(os.getenv('SKIM_DB_POOL_MIN_SIZE') or '1'),
+        'max_size': int(os.getenv('SKIM_DB_POOL_MAX_SIZE') or '10') or 10,
+        'max_inactive_connection_lifetime': float(
+            os.getenv('SKIM_DB_POOL_IDLE_TIMEOUT') or '300'
+        ),
+    }
+
+
 async def migrate():
     with tracer.start_as_current_span('migrate'):
         async with connection() as db, db.transaction():
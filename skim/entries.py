@@ -1,5 +1,11 @@
+import math
+import os
+from datetime import datetime, timedelta, timezone
+
 from skim import database
 
+RETENTION = timedelta(days=int(os.getenv('SKIM_ENTRIES_RETENTION_DAYS') or '365'))
+
 
 def all_entries():
     return _query_results(
@@ -10,132 +16,229 @@ def all_entries():
                 entries.title,
                 entries.link,
                 entries.body,
-                entry_creators.creator,
-                entry_categories.category
+                ARRAY(
+                    SELECT  creator
+                    FROM    entry_creators
+                    WHERE   entry_creators.feed = entries.feed AND
+                            entry_creators.id = entries.id AND
+                            entry_creators.timestamp = entries.timestamp
+                ) AS creators,
+                ARRAY(
+                    SELECT  category
+                    FROM    entry_categories
+                    WHERE   entry_categories.feed = entries.feed AND
+                            entry_categories.id = entries.id AND
+                            entry_categories.timestamp = entries.timestamp
+                ) AS categories
         FROM    entries
-                LEFT JOIN  entry_creators
-                        ON entry_creators.feed = entries.feed AND
-                           entry_creators.id = entries.id
-                LEFT JOIN  entry_categories
-                        ON entry_categories.feed = entries.feed AND
-                           entry_categories.id = entries.id
-        ORDER BY timestamp DESC
+        ORDER BY entries.timestamp DESC, entries.feed DESC, entries.id DESC
     """
     )
 
 
-def older_than(timestamp, filters, limit=100):
-    parameters = [timestamp]
-    where = f'timestamp < ${len(parameters)} '
+def older_than(position, filters, limit=100, bodies=True):
+    """Pages through entries from newest to oldest, starting just after the
+    given position, which is either a timestamp or a (timestamp, feed, id) key
+    of the last entry on the previous page.  When searching, entries are ranked
+    by relevance first, and the key leads with the rank of the last entry.
+    Without bodies, the listing skips reading the (much larger) entry bodies,
+    which can be loaded one at a time with body()."""
+    if isinstance(position, datetime):
+        # no feed sorts before the empty string, so this picks up exactly the
+        # entries older than the timestamp
+        position = (position, '', '')
+
+    timestamp, feed, id = position[-3:]
+    rank = position[0] if len(position) == 4 else math.inf
+
+    parameters = []
+
+    def parameter(value):
+        parameters.append(value)
+        return f'${len(parameters)}'
+
+    creator, category = filters.get('creator'), filters.get('category')
+    search = filters.get('q')
+
+    # creators and categories carry their entry's timestamp, so a filtered page
+    # walks the filter's own index in timeline order rather than sorting every
+    # entry that matches it, and every join matches on the timestamp too, so
+    # that only the months being paged through are probed
+    conditions = []
+    if creator:
+        driver = 'entry_creators'
+        conditions.append(f'entry_creators.creator = {parameter(creator)}')
+    elif category:
+        driver = 'entry_categories'
+        conditions.append(f'entry_categories.category = {parameter(category)}')
+    else:
+        driver = 'entries'
+
+    keys = [f'{driver}.timestamp', f'{driver}.feed', f'{driver}.id']
+    bounds = [parameter(timestamp), parameter(feed), parameter(id)]
+
+    if search:
+        terms = f"websearch_to_tsquery('english', {parameter(search)})"
+        conditions.append(f'entries.search @@ {terms}')
+        keys.insert(0, f'ts_rank(entries.search, {terms})')
+        bounds.insert(0, f'{parameter(rank)}::real')
+    else:
+        # the bare timestamp bound is implied by the row comparison, but lets
+        # the index seek straight to the position when it doesn't lead with
+        # the timestamp
+        conditions.append(f'{driver}.timestamp <= {bounds[0]}')
+
+    conditions.append(f'({", ".join(keys)}) < ({", ".join(bounds)})')
 
     if feed := filters.get('feed'):
-        parameters.append(feed)
-        where += f'AND entries.feed = ${len(parameters)} '
+        conditions.append(f'{driver}.feed = {parameter(feed)}')
 
-    if creator := filters.get('creator'):
-        parameters.append(creator)
-        where += f'AND entry_creators.creator = ${len(parameters)} '
+    if creator and category:
+        conditions.append(
+            f"""
+            EXISTS (
+                SELECT  1
+                FROM    entry_categories
+                WHERE   entry_categories.feed = entries.feed AND
+                        entry_categories.id = entries.id AND
+                        entry_categories.timestamp = entries.timestamp AND
+                        entry_categories.category = {parameter(category)}
+            )
+            """
+        )
 
-    if category := filters.get('category'):
-        parameters.append(category)
-        where += f'AND entry_categories.category = ${len(parameters)} '
+    source = 'entries'
+    if driver != 'entries':
+        source = f"""
+        {driver}
+        JOIN entries ON entries.feed = {driver}.feed AND
+                        entries.id = {driver}.id AND
+                        entries.timestamp = {driver}.timestamp
+        """
 
-    parameters.append(limit)
+    columns = ['feed', 'id', 'timestamp', 'title', 'link']
+    if bodies:
+        columns.append('body')
+    selected = ', '.join(f'entries.{column}' for column in columns)
+    if search:
+        selected += f', {keys[0]} AS rank'
+    order = ['timestamp', 'feed', 'id']
+    if search:
+        order.insert(0, 'rank')
 
     query = f"""
-    WITH filtered(feed, id, timestamp, title, link, body) AS (
-        SELECT  entries.feed,
-                entries.id,
-                entries.timestamp,
-                entries.title,
-                entries.link,
-                entries.body
-        FROM    entries
-                LEFT JOIN  entry_creators
-                        ON entry_creators.feed = entries.feed AND
-                           entry_creators.id = entries.id
-                LEFT JOIN  entry_categories
-                        ON entry_categories.feed = entries.feed AND
-                           entry_categories.id = entries.id
-        WHERE   {where}
-        GROUP BY entries.feed,
-                 entries.id,
-                 entries.timestamp,
-                 entries.title,
-                 entries.link,
-                 entries.body
-        ORDER BY entries.timestamp DESC
-        LIMIT ${len(parameters)}
+    WITH filtered AS (
+        SELECT  {selected}
+        FROM    {source}
+        WHERE   {' AND '.join(conditions)}
+        ORDER BY {', '.join(f'{key} DESC' for key in keys)}
+        LIMIT {parameter(limit)}
     )
-    SELECT  filtered.feed,
-            filtered.id,
-            filtered.timestamp,
-            filtered.title,
-            filtered.link,
-            filtered.body,
-            entry_creators.creator,
-            entry_categories.category
+    SELECT  filtered.*,
+            ARRAY(
+                SELECT  creator
+                FROM    entry_creators
+                WHERE   entry_creators.feed = filtered.feed AND
+                        entry_creators.id = filtered.id AND
+                        entry_creators.timestamp = filtered.timestamp
+            ) AS creators,
+            ARRAY(
+                SELECT  category
+                FROM    entry_categories
+                WHERE   entry_categories.feed = filtered.feed AND
+                        entry_categories.id = filtered.id AND
+                        entry_categories.timestamp = filtered.timestamp
+            ) AS categories
     FROM    filtered
-            LEFT JOIN  entry_creators
-                    ON entry_creators.feed = filtered.feed AND
-                       entry_creators.id = filtered.id
-            LEFT JOIN  entry_categories
-                    ON entry_categories.feed = filtered.feed AND
-                       entry_categories.id = filtered.id
-    ORDER BY filtered.timestamp DESC
+    ORDER BY {', '.join(f'filtered.{column} DESC' for column in order)}
     """
     return _query_results(query, parameters)
 
 
+def position(entry):
+    """The key to pass to older_than to get the entries after this one"""
+    if 'rank' in entry:
+        return entry['rank'], entry['timestamp'], entry['feed'], entry['id']
+    return entry['timestamp'], entry['feed'], entry['id']
+
+
+async def body(feed, id):
+    """Returns the body of a single entry, or None if there's no such entry"""
+    async with database.connection() as db:
+        row = await db.fetchrow(
+            'SELECT body FROM entries WHERE feed = $1 AND id = $2', feed, id
+        )
+    return row and (row['body'] or '')
+
+
 async def _query_results(query, parameters=None):
     parameters = parameters or []
     async with database.connection() as db:
-        entry = {'feed': None, 'id': None}
         for row in await db.fetch(query, *parameters):
-            if (row['feed'], row['id']) == (entry['feed'], entry['id']):
-                entry['creators'].add(row['creator'])
-                entry['categories'].add(row['category'])
-                continue
+            entry = dict(row)
+            entry['creators'] = set(entry['creators'])
+            entry['categories'] = set(entry['categories'])
+            yield entry
 
-            if entry['feed'] and entry['id']:
-                entry['creators'].discard(None)
-                entry['categories'].discard(None)
-                yield entry
 
-            entry = dict(row)
-            entry['timestamp'] = entry['timestamp']
+async def add_all(feed, entries, db=None):
+    return (await add_many({feed: entries}, db=db))[feed]
 
-            entry['creators'] = {entry.pop('creator', None)}
-            entry['categories'] = {entry.pop('category', None)}
 
-        if entry['feed'] and entry['id']:
-            entry['creators'].discard(None)
-            entry['categories'].discard(None)
-            yield entry
+async def add_many(entries_by_feed, db=None):
+    """Adds the entries found in several feeds in one transaction, and returns
+    how many were new for each"""
+    async with database.connection(db) as db, db.transaction():
+        # plenty of feeds keep listing entries from months that have been
+        # pruned, which shouldn't be stored (and their months recreated) again
+        months = {
+            month(entry['timestamp'])
+            for entries in entries_by_feed.values()
+            for entry in entries
+            if entry['timestamp']
+        }
+        query = 'SELECT month FROM entries_pruned WHERE month = ANY($1::timestamptz[])'
+        pruned = {row['month'] for row in await db.fetch(query, list(months))}
+        entries_by_feed = {
+            feed: [
+                entry
+                for entry in entries
+                if not entry['timestamp'] or month(entry['timestamp']) not in pruned
+            ]
+            for feed, entries in entries_by_feed.items()
+        }
+
+        # insert skips entries that are already stored, so the ids parse_feed
+        # looked up aren't checked again here
+        return {
+            feed: await insert(db, feed, entries)
+            for feed, entries in entries_by_feed.items()
+        }
+
 
+async def unseen(feed, ids):
+    """Returns which of the given entry ids are not yet stored for the feed"""
+    if not ids:
+        return set()
 
-async def add_all(feed, entries):
     async with database.connection() as db:
-        new_entries = 0
-        entries = list(entries)
-        seen, _ = await partition_by_seen(feed, entries, db)
-        for entry in entries:
-            if entry['id'] in seen:
-                continue
-            new = await add(feed, **entry, db=db)
-            new_entries += 1 if new else 0
-        return new_entries
+        _, unseen = await partition_by_seen(feed, ids, db)
+        return unseen
+
 
+async def ids(feed):
+    """Returns the ids of every entry stored for the feed"""
+    async with database.connection() as db:
+        rows = await db.fetch('SELECT id FROM entries WHERE feed = $1', feed)
+    return {row['id'] for row in rows}
 
-async def partition_by_seen(feed, entries, db):
-    ids = [entry['id'] for entry in entries]
 
-    id_parameters = ', '.join(f'${i+2}' for i in range(len(ids)))
-    query = (
-        f'SELECT entries.id FROM entries WHERE feed = $1 AND id in ({id_parameters});'
-    )
+async def partition_by_seen(feed, ids, db):
+    # one array parameter keeps this a single prepared statement no matter how
+    # many ids a feed has
+    query = 'SELECT entries.id FROM entries WHERE feed = $1 AND id = ANY($2::text[])'
 
-    seen = set(row['id'] for row in await db.fetch(query, feed, *ids))
+    seen = set(row['id'] for row in await db.fetch(query, feed, list(ids)))
     unseen = set(ids) - seen
 
     return seen, unseen
@@ -150,32 +253,129 @@ async def add(
     body=None,
     creators=None,
     categories=None,
-    db=None,
 ):
-    async with database.connection() as db:
+    entry = {
+        'id': id,
+        'timestamp': timestamp,
+        'title': title,
+        'link': link,
+        'body': body,
+        'creators': creators,
+        'categories': categories,
+    }
+    async with database.connection() as db, db.transaction():
+        return await insert(db, feed, [entry]) > 0
+
+
+async def insert(db, feed, entries):
+    """Inserts a batch of entries along with their creators and categories,
+    returning how many of the entries were new"""
+    if not entries:
+        return 0
+
+    # entries are only unique per (feed, id, timestamp) across the partitions,
+    # so keep just the first of any that share an id, like a unique (feed, id)
+    # would have, and skip ids that are already stored below
+    entries = list({entry['id']: entry for entry in reversed(entries)}.values())
+
+    await db.execute(
+        'SELECT create_entries_partition(month) FROM unnest($1::timestamptz[]) month',
+        list({month(entry['timestamp']) for entry in entries if entry['timestamp']}),
+    )
+
+    query = """
+    INSERT INTO entries (feed, id, timestamp, title, link, body)
+    SELECT  $1, new.*
+    FROM    unnest($2::text[], $3::timestamptz[], $4::text[], $5::text[], $6::text[])
+                AS new(id, timestamp, title, link, body)
+    WHERE   NOT EXISTS (
+                SELECT  1
+                FROM    entries
+                WHERE   entries.feed = $1 AND entries.id = new.id
+            )
+    ON CONFLICT DO NOTHING
+    """
+    status = await db.execute(
+        query,
+        feed,
+        [entry['id'] for entry in entries],
+        [entry['timestamp'] for entry in entries],
+        [entry['title'] for entry in entries],
+        [entry['link'] for entry in entries],
+        [entry['body'] for entry in entries],
+    )
+    # status will be a string like "INSERT 0 12"
+    new_entries = int(status.split()[-1])
+
+    creators = [
+        (feed, entry['id'], creator)
+        for entry in entries
+        for creator in entry.get('creators') or []
+    ]
+    if creators:
+        query = """
+        INSERT INTO entry_creators (feed, id, timestamp, creator)
+        SELECT  feed, id, timestamp, $3
+        FROM    entries
+        WHERE   feed = $1 AND id = $2
+        ON CONFLICT DO NOTHING
+        """
+        await db.executemany(query, creators)
+
+    categories = [
+        (feed, entry['id'], category)
+        for entry in entries
+        for category in entry.get('categories') or []
+    ]
+    if categories:
         query = """
-        INSERT INTO entries (feed, id, timestamp, title, link, body)
-        VALUES ($1, $2, $3, $4, $5, $6)
+        INSERT INTO entry_categories (feed, id, timestamp, category)
+        SELECT  feed, id, timestamp, $3
+        FROM    entries
+        WHERE   feed = $1 AND id = $2
         ON CONFLICT DO NOTHING
         """
-        status = await db.execute(query, feed, id, timestamp, title, link, body)
-        # status will be a string like "INSERT 0 1"
-        was_new = sum(map(int, status.split()[1:])) > 0
-
-        for creator in creators or []:
-            query = """
-            INSERT INTO entry_creators (feed, id, creator)
-            VALUES ($1, $2, $3)
-            ON CONFLICT DO NOTHING
-            """
-            await db.execute(query, feed, id, creator)
+        await db.executemany(query, categories)
 
-        for category in categories or []:
-            query = """
-            INSERT INTO entry_categories (feed, id, category)
-            VALUES ($1, $2, $3)
-            ON CONFLICT DO NOTHING
-            """
-            await db.execute(query, feed, id, category)
+    return new_entries
+
+
+def month(timestamp):
+    """The start of the month (in UTC) that the timestamp falls in"""
+    return timestamp.astimezone(timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+async def prune(before):
+    """Drops every month of entries that ended before the given time, along
+    with their creators and categories, returning the months dropped"""
+    query = """
+    SELECT  partitions.relname AS name
+    FROM    pg_inherits
+            JOIN pg_class AS partitions ON partitions.oid = pg_inherits.inhrelid
+    WHERE   pg_inherits.inhparent = 'entries'::regclass
+    """
+    dropped = []
+    async with database.connection() as db, db.transaction():
+        for row in await db.fetch(query):
+            start = datetime.strptime(row['name'], 'entries_y%Ym%m')
+            start = start.replace(tzinfo=timezone.utc)
+            if month(start + timedelta(days=31)) > before:
+                continue
+
+            # the creators and categories have to go first, since they refer
+            # to the entries partition
+            suffix = row['name'].removeprefix('entries_')
+            await db.execute(
+                f'DROP TABLE entry_creators_{suffix}, entry_categories_{suffix}'
+            )
+            await db.execute(f'ALTER TABLE entries DETACH PARTITION entries_{suffix}')
+            await db.execute(f'DROP TABLE entries_{suffix}')
+            await db.execute(
+                'INSERT INTO entries_pruned (month) VALUES ($1) ON CONFLICT DO NOTHING',
+                start,
+            )
+            dropped.append(start)
 
-        return was_new
+    return sorted(dropped)
@@ -1,4 +1,7 @@
-from datetime import datetime, timezone
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta, timezone
 from urllib.parse import urlencode
 
 import humanize
@@ -12,6 +15,8 @@ routes = web.RouteTableDef()
 
 END_OF_TIME = datetime.max.replace(tzinfo=timezone.utc)
 
+PAGE_SIZE = 20
+
 
 routes.static(
     '/static',
@@ -33,19 +38,42 @@ def query_string(query):
     return urlencode({k: v for k, v in query.items() if v})
 
 
+def cursor(entry):
+    """An opaque token for the position just after this entry in a listing"""
+    *rank, timestamp, feed, id = entries.position(entry)
+    token = json.dumps([*rank, timestamp.isoformat(), feed, id]).encode()
+    return base64.urlsafe_b64encode(token).decode()
+
+
+def from_cursor(token):
+    try:
+        *rank, timestamp, feed, id = json.loads(base64.urlsafe_b64decode(token))
+        position = (datetime.fromisoformat(timestamp), str(feed), str(id))
+        if rank:
+            # search results are keyed by their rank first
+            (relevance,) = rank
+            return (float(relevance), *position)
+        return position
+    except (binascii.Error, TypeError, ValueError):
+        raise ValueError(f'Invalid cursor {token!r}')
+
+
 def static_file(app, filename):
     return app.router['static'].url_for(filename=filename)
 
 
 def crawl_sparkline(subscription):
-    recent_crawls = subscription['recent_crawls']
+    """Draws a line for each hour a feed was crawled in, as tall as the number
+    of new entries it found, and colored by how its crawls went"""
+    recent_hours = subscription['recent_hours']
 
     earliest_crawl = subscription['earliest_crawl']
     if not earliest_crawl:
         return ""
 
     now = dates.utcnow()
-    timerange = now - earliest_crawl
+    # the last hour is still filling in, but gets its place on the line
+    timerange = now - earliest_crawl + timedelta(hours=1)
 
     width = 336
     height = max(8, subscription['p95_new_entries'])
@@ -55,25 +83,26 @@ def crawl_sparkline(subscription):
 
     lines = []
 
-    for crawl in recent_crawls:
-        if not crawl['crawled']:
-            continue
-        x = second_width * (crawl['crawled'] - earliest_crawl).total_seconds()
-        y = crawl['new_entries'] or 0
+    for hour in recent_hours:
+        x = second_width * (hour['hour'] - earliest_crawl).total_seconds()
+        y = hour['new_entries'] or -1
 
-        match crawl['status']:
-            case _ if 200 <= crawl['status'] < 300:
+        match hour:
+            case {'new_entries': new_entries} if new_entries:
                 color = 'green'
-                y = y or -1
-                opacity = 0.3 if y == -1 else 1.0
-            case 304:
-                color = 'green'
-                y = -1
-                opacity = 0.05
-            case _:
+                opacity = 1.0
+            case {'failed': failed, 'crawls': crawls} if failed == crawls:
                 color = 'red'
-                y = -1
                 opacity = 0.8
+            case {'succeeded': succeeded} if succeeded:
+                color = 'green'
+                opacity = 0.3
+            case {'unchanged': unchanged} if unchanged:
+                color = 'green'
+                opacity = 0.15
+            case _:
+                color = 'green'
+                opacity = 0.05
 
         lines.append(
             f'<line x1="{x}" y1="{bottom}" x2="{x}" y2="{bottom - y}" '
@@ -99,9 +128,12 @@ def crawl_sparkline(subscription):
 @template('home.html')
 async def home(request):
     try:
-        older_than = dates.from_iso(request.query['older-than'])
-    except KeyError:
-        older_than = END_OF_TIME
+        if 'after' in request.query:
+            position = from_cursor(request.query['after'])
+        elif 'older-than' in request.query:
+            position = dates.from_iso(request.query['older-than'])
+        else:
+            position = END_OF_TIME
     except ValueError:
         return web.Response(status=302, headers={'Location': '/'})
 
@@ -109,17 +141,42 @@ async def home(request):
         'feed': request.query.get('feed'),
         'creator': request.query.get('creator'),
         'category': request.query.get('category'),
+        'q': request.query.get('q'),
     }
 
+    page = [
+        entry
+        async for entry in entries.older_than(
+            position, filters, limit=PAGE_SIZE, bodies=False
+        )
+    ]
+
+    # only the feeds on this page are needed, and only enough to label entries
+    feeds = {entry['feed'] for entry in page}
     return {
         'filters': filters,
-        'entries': entries.older_than(older_than, filters, limit=20),
-        'subscriptions': {
-            s['feed']: s async for s in subscriptions.all_subscriptions()
-        },
+        'entries': page,
+        'subscriptions': await subscriptions.metadata(feeds),
     }
 
 
+@routes.get('/entries/body')
+async def entry_body(request):
+    body = await entries.body(
+        request.query.get('feed', ''), request.query.get('id', '')
+    )
+    if body is None:
+        raise web.HTTPNotFound()
+
+    # entries are never changed once they're stored
+    return web.Response(
+        status=200,
+        content_type='text/html',
+        headers={'Cache-Control': 'private, max-age=86400'},
+        text=body,
+    )
+
+
 @routes.get("/hot")
 @template("hot.html")
 async def hot(request):
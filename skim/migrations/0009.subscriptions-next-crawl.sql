@@ -0,0 +1,2 @@
+ALTER TABLE subscriptions ADD COLUMN next_crawl_at timestamptz NULL;
+CREATE INDEX subscriptions_next_crawl_at ON subscriptions (next_crawl_at);
@@ -0,0 +1 @@
+ALTER TABLE subscriptions ADD COLUMN hints TEXT NULL;
@@ -0,0 +1 @@
+ALTER TABLE subscriptions ADD COLUMN lease_expires_at timestamptz NULL;
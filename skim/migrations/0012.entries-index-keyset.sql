@@ -0,0 +1,2 @@
+CREATE INDEX entries_by_timestamp_feed_id ON entries (timestamp DESC, feed DESC, id DESC);
+DROP INDEX entries_by_timestamp;
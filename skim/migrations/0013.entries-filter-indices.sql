@@ -0,0 +1,17 @@
+ALTER TABLE entry_creators ADD COLUMN timestamp timestamptz NULL;
+UPDATE entry_creators
+SET    timestamp = entries.timestamp
+FROM   entries
+WHERE  entries.feed = entry_creators.feed AND entries.id = entry_creators.id;
+ALTER TABLE entry_creators ALTER COLUMN timestamp SET NOT NULL;
+CREATE INDEX entry_creators_by_creator_timestamp ON entry_creators (creator, timestamp DESC, feed DESC, id DESC);
+
+ALTER TABLE entry_categories ADD COLUMN timestamp timestamptz NULL;
+UPDATE entry_categories
+SET    timestamp = entries.timestamp
+FROM   entries
+WHERE  entries.feed = entry_categories.feed AND entries.id = entry_categories.id;
+ALTER TABLE entry_categories ALTER COLUMN timestamp SET NOT NULL;
+CREATE INDEX entry_categories_by_category_timestamp ON entry_categories (category, timestamp DESC, feed DESC, id DESC);
+
+CREATE INDEX entries_by_feed_timestamp_id ON entries (feed, timestamp DESC, id DESC);
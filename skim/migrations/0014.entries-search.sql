@@ -0,0 +1,5 @@
+ALTER TABLE entries ADD COLUMN search tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', title), 'A') ||
+    setweight(to_tsvector('english', regexp_replace(coalesce(body, ''), '<[^>]*>', ' ', 'g')), 'B')
+) STORED;
+CREATE INDEX entries_search ON entries USING GIN (search);
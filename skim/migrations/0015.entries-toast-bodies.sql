@@ -0,0 +1,3 @@
+-- push all but the smallest bodies out to TOAST, keeping the rows that the
+-- timeline scans narrow
+ALTER TABLE entries SET (toast_tuple_target = 256);
@@ -0,0 +1,95 @@
+-- entries and their creators and categories are partitioned by the month of
+-- their timestamp (in UTC), so old months can be dropped whole and the
+-- timeline only touches the months it's paging through
+
+ALTER TABLE entries RENAME TO unpartitioned_entries;
+ALTER TABLE entry_creators RENAME TO unpartitioned_entry_creators;
+ALTER TABLE entry_categories RENAME TO unpartitioned_entry_categories;
+
+CREATE TABLE entries (
+    feed TEXT NOT NULL,
+    id TEXT NOT NULL,
+    timestamp timestamptz NOT NULL,
+    title TEXT NOT NULL,
+    link TEXT NULL,
+    body TEXT NULL,
+    search tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', title), 'A') ||
+        setweight(to_tsvector('english', regexp_replace(coalesce(body, ''), '<[^>]*>', ' ', 'g')), 'B')
+    ) STORED
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE entry_creators (
+    feed TEXT NOT NULL,
+    id TEXT NOT NULL,
+    timestamp timestamptz NOT NULL,
+    creator TEXT NOT NULL
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE entry_categories (
+    feed TEXT NOT NULL,
+    id TEXT NOT NULL,
+    timestamp timestamptz NOT NULL,
+    category TEXT NOT NULL
+) PARTITION BY RANGE (timestamp);
+
+CREATE FUNCTION create_entries_partition(during timestamptz) RETURNS void AS $$
+DECLARE
+    starting timestamptz := date_trunc('month', during, 'UTC');
+    ending timestamptz := ((starting AT TIME ZONE 'UTC') + INTERVAL '1 month') AT TIME ZONE 'UTC';
+    suffix TEXT := to_char(starting AT TIME ZONE 'UTC', '"y"YYYY"m"MM');
+BEGIN
+    IF to_regclass('entries_' || suffix) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    -- serialize concurrent writers racing to create the same month
+    PERFORM pg_advisory_xact_lock(hashtext('create_entries_partition'));
+
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF entries '
+        'FOR VALUES FROM (%L) TO (%L) WITH (toast_tuple_target = 256)',
+        'entries_' || suffix, starting, ending
+    );
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF entry_creators '
+        'FOR VALUES FROM (%L) TO (%L)',
+        'entry_creators_' || suffix, starting, ending
+    );
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF entry_categories '
+        'FOR VALUES FROM (%L) TO (%L)',
+        'entry_categories_' || suffix, starting, ending
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT  create_entries_partition(month)
+FROM    (SELECT DISTINCT date_trunc('month', timestamp, 'UTC') FROM unpartitioned_entries) AS months(month);
+
+INSERT INTO entries (feed, id, timestamp, title, link, body)
+SELECT feed, id, timestamp, title, link, body FROM unpartitioned_entries;
+
+INSERT INTO entry_creators (feed, id, timestamp, creator)
+SELECT feed, id, timestamp, creator FROM unpartitioned_entry_creators;
+
+INSERT INTO entry_categories (feed, id, timestamp, category)
+SELECT feed, id, timestamp, category FROM unpartitioned_entry_categories;
+
+DROP TABLE unpartitioned_entry_creators;
+DROP TABLE unpartitioned_entry_categories;
+DROP TABLE unpartitioned_entries;
+
+-- the partition key has to be part of every unique key, so an entry is only
+-- unique per timestamp here; entries.insert skips ids that are already stored
+ALTER TABLE entries ADD PRIMARY KEY (feed, id, timestamp);
+ALTER TABLE entry_creators ADD PRIMARY KEY (feed, id, timestamp, creator);
+ALTER TABLE entry_creators ADD FOREIGN KEY (feed, id, timestamp) REFERENCES entries (feed, id, timestamp) ON DELETE CASCADE;
+ALTER TABLE entry_categories ADD PRIMARY KEY (feed, id, timestamp, category);
+ALTER TABLE entry_categories ADD FOREIGN KEY (feed, id, timestamp) REFERENCES entries (feed, id, timestamp) ON DELETE CASCADE;
+
+CREATE INDEX entries_by_timestamp_feed_id ON entries (timestamp DESC, feed DESC, id DESC);
+CREATE INDEX entries_by_feed_timestamp_id ON entries (feed, timestamp DESC, id DESC);
+CREATE INDEX entries_search ON entries USING GIN (search);
+CREATE INDEX entry_creators_by_creator_timestamp ON entry_creators (creator, timestamp DESC, feed DESC, id DESC);
+CREATE INDEX entry_categories_by_category_timestamp ON entry_categories (category, timestamp DESC, feed DESC, id DESC);
@@ -0,0 +1 @@
+ALTER TABLE crawl_log ADD COLUMN unchanged BOOLEAN NOT NULL DEFAULT FALSE;
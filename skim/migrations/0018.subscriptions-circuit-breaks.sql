@@ -0,0 +1 @@
+ALTER TABLE subscriptions ADD COLUMN circuit_breaks INT NOT NULL DEFAULT 0;
@@ -0,0 +1,40 @@
+-- the subscriptions page summarizes each feed's crawls by the hour, so that
+-- its cost depends on how many hours it shows rather than how often feeds are
+-- crawled; the crawler adds to these as it logs crawls
+CREATE TABLE crawl_rollups (
+    feed TEXT NOT NULL,
+    hour timestamptz NOT NULL,
+    crawls INT NOT NULL DEFAULT 0,
+    succeeded INT NOT NULL DEFAULT 0,
+    unchanged INT NOT NULL DEFAULT 0,
+    not_modified INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    new_entries INT NOT NULL DEFAULT 0,
+    max_new_entries INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (feed, hour)
+);
+
+CREATE INDEX crawl_rollups_hour ON crawl_rollups (hour DESC);
+
+INSERT INTO crawl_rollups (
+    feed,
+    hour,
+    crawls,
+    succeeded,
+    unchanged,
+    not_modified,
+    failed,
+    new_entries,
+    max_new_entries
+)
+SELECT  feed,
+        date_trunc('hour', crawled, 'UTC'),
+        COUNT(*),
+        COUNT(*) FILTER (WHERE status BETWEEN 200 AND 299 AND NOT unchanged),
+        COUNT(*) FILTER (WHERE status BETWEEN 200 AND 299 AND unchanged),
+        COUNT(*) FILTER (WHERE status BETWEEN 300 AND 399),
+        COUNT(*) FILTER (WHERE status IS NULL OR status NOT BETWEEN 200 AND 399),
+        COALESCE(SUM(new_entries), 0),
+        COALESCE(MAX(new_entries), 0)
+FROM    crawl_log
+GROUP BY feed, date_trunc('hour', crawled, 'UTC');
@@ -0,0 +1,5 @@
+-- the months entries.prune has dropped, so that entries from them that feeds
+-- are still listing aren't stored (and their months recreated) all over again
+CREATE TABLE entries_pruned (
+    month timestamptz NOT NULL PRIMARY KEY
+);
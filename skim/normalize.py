@@ -24,9 +24,62 @@ def feed(feed):
             feed.get('logo') or feed.get('atom:icon') or feed.get('image')
         ),
         'caching': feed.get('skim:caching'),
+        'hints': feed_hints(feed),
     }
 
 
+SYNDICATION_NAMESPACE = 'http://purl.org/rss/1.0/modules/syndication/'
+
+SYNDICATION_PERIODS = {
+    'hourly': 3600,
+    'daily': 86400,
+    'weekly': 7 * 86400,
+    'monthly': 30 * 86400,
+    'yearly': 365 * 86400,
+}
+
+
+def feed_hints(feed):
+    """Extracts the publisher's hints about how often the feed should be crawled,
+    from RSS <ttl>, <skipHours> and <skipDays>, and the RSS syndication module"""
+    hints = {}
+
+    if ttl := integer(feed.get('ttl')):
+        hints['ttl'] = ttl
+
+    hours = map(integer, children(feed.get('skipHours'), 'hour'))
+    if skip_hours := [hour for hour in hours if hour is not None]:
+        hints['skip_hours'] = skip_hours
+
+    if skip_days := children(feed.get('skipDays'), 'day'):
+        hints['skip_days'] = [str(day).strip().title() for day in skip_days]
+
+    alias = feed.get('skim:namespaces', {}).get(SYNDICATION_NAMESPACE, 'sy')
+    update_period = str(feed.get(f'{alias}:updatePeriod') or '').strip()
+    if period := SYNDICATION_PERIODS.get(update_period):
+        frequency = integer(feed.get(f'{alias}:updateFrequency')) or 1
+        hints['update_interval'] = period // frequency
+
+    return hints or None
+
+
+def children(element, tag):
+    if not isinstance(element, dict):
+        return []
+    return list_or_none(element.get(tag)) or []
+
+
+def integer(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def entries(raw_entries):
+    return [entry(raw_entry) for raw_entry in raw_entries]
+
+
 def entry(entry):
     link = (
         entry.get('link')
@@ -36,13 +89,7 @@ def entry(entry):
         or urllike(entry.get('guid'))
     )
     return {
-        'id': (
-            entry.get('id')
-            or entry.get('atom:id')
-            or entry.get('guid')
-            or entry.get('link')
-            or entry.get('atom:link[alternate]')
-        ),
+        'id': entry_id(entry),
         'title': title(entry.get('title') or entry.get('atom:title')),
         'link': link,
         'timestamp': entry_date(
@@ -69,6 +116,18 @@ def entry(entry):
     }
 
 
+def entry_id(entry):
+    """The entry's identifier, which is cheap enough to work out before deciding
+    whether the rest of the entry is worth normalizing"""
+    return (
+        entry.get('id')
+        or entry.get('atom:id')
+        or entry.get('guid')
+        or entry.get('link')
+        or entry.get('atom:link[alternate]')
+    )
+
+
 def feed_icon(icon):
     if not icon:
         return None
@@ -11,25 +11,26 @@ XML_FEEDS = {
 }
 
 
-async def parse(content_type, charset, stream):
-    """Given the type, character set, and a stream of content, parse the feed
-    and entries of the feed, yielding each as a pair."""
+def parse_bytes(content_type, charset, body):
+    """Given the type, character set, and the complete content of a feed that
+    has already been read into memory, parse the feed and its entries as a pair.
+    This does no I/O, so it can be handed off to another process."""
     if content_type in XML_FEEDS:
-        return await parse_xml_feed(content_type, charset, stream)
+        return xml_feed(content_type, xml_from_bytes(body, XML_EVENTS))
 
     raise NotImplementedError(
         f'Parsing feeds of type "{content_type}" is not implemented'
     )
 
 
-async def xml_from_stream(stream, events):
+XML_EVENTS = ['start-ns', 'start', 'end']
+
+
+def xml_from_bytes(body, events):
     parser = ElementTree.XMLPullParser(events)
-    while chunk := await stream.read(1024):
-        # clean known problematic characters
-        chunk = chunk.replace(b'\x08', b'')
-        parser.feed(chunk)
-        for event, element in parser.read_events():
-            yield event, element
+    # clean known problematic characters
+    parser.feed(body.replace(b'\x08', b''))
+    yield from parser.read_events()
 
 
 XML_FORMATS = {
@@ -53,9 +54,8 @@ NAMESPACE_ALIASES = {
 EMBEDDABLE_HTML_TAGS = {'i', 'em'}
 
 
-async def parse_xml_feed(content_type, charset, stream):
-    """Parse an XML-based feed, like an RSS or Atom feed, returning a feed and
-    its entries as a pair"""
+def xml_feed(content_type, element_stream):
+    """Assemble a feed and its entries from a stream of XML parsing events"""
     stack = [{}]
 
     namespace_aliases = dict(NAMESPACE_ALIASES)
@@ -68,9 +68,7 @@ async def parse_xml_feed(content_type, charset, stream):
 
     xml_format = XML_FORMATS.get(content_type)
 
-    element_stream = xml_from_stream(stream, ['start-ns', 'start', 'end'])
-
-    async for event, element in element_stream:
+    for event, element in element_stream:
         if event == 'start-ns':
             alias, namespace = element
             if namespace in namespace_aliases:
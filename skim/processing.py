@@ -0,0 +1,38 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+# how many processes to spread parsing and normalizing feeds over; with none,
+# that work happens on the crawler's own event loop
+PROCESSES = int(os.getenv('SKIM_CRAWL_PROCESSES') or '0')
+
+_executor = None
+
+
+@contextmanager
+def pool():
+    global _executor
+    if not PROCESSES or _executor:
+        yield
+        return
+
+    _executor = ProcessPoolExecutor(
+        PROCESSES, mp_context=multiprocessing.get_context('spawn')
+    )
+    try:
+        yield
+    finally:
+        executor, _executor = _executor, None
+        executor.shutdown(cancel_futures=True)
+
+
+async def run(function, *args):
+    """Runs a CPU-bound function in the process pool when there is one, or right
+    here when there isn't"""
+    if not _executor:
+        return function(*args)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, function, *args)
@@ -0,0 +1,147 @@
+import json
+import os
+from datetime import timedelta
+
+from skim import database, dates
+
+MIN_INTERVAL = timedelta(minutes=int(os.getenv('SKIM_CRAWL_MIN_INTERVAL') or '15'))
+MAX_INTERVAL = timedelta(minutes=int(os.getenv('SKIM_CRAWL_MAX_INTERVAL') or '1440'))
+LOOKBACK = timedelta(days=14)
+
+# no publisher hint can push a feed's next crawl further out than this
+MAX_HINTED_INTERVAL = timedelta(days=7)
+
+# beyond this many consecutive failures, the backoff is pinned at MAX_INTERVAL
+MAX_BACKOFF_STEPS = 16
+
+# after this many consecutive failures, the feed's circuit breaker trips and
+# parks it for BREAKER_COOLDOWN, which doubles each time it trips again
+BREAKER_THRESHOLD = int(os.getenv('SKIM_CRAWL_BREAKER_THRESHOLD') or '8')
+BREAKER_COOLDOWN = timedelta(
+    hours=int(os.getenv('SKIM_CRAWL_BREAKER_COOLDOWN') or '24')
+)
+MAX_BREAKER_COOLDOWN = timedelta(days=30)
+
+
+def next_crawl(now, recent_crawls, hints=None, not_before=None):
+    """Given a feed's recent crawls, newest first, decide when it is next due,
+    pushed back as far as the publisher's hints ask"""
+    next_crawl_at = now + interval(now, recent_crawls)
+    return respect_hints(now, next_crawl_at, hints or {}, not_before)
+
+
+def interval(now, recent_crawls):
+    """Feeds that are failing back off exponentially.  Otherwise, feeds are
+    crawled about twice as often as their crawls have turned up new entries, so
+    busy feeds are checked often while quiet or mostly-304 feeds drift towards
+    the maximum interval."""
+    if failures := consecutive_failures(recent_crawls):
+        steps = min(failures, MAX_BACKOFF_STEPS)
+        return min(MIN_INTERVAL * 2**steps, MAX_INTERVAL)
+
+    productive = sum(1 for crawl in recent_crawls if crawl['new_entries'])
+    if not productive:
+        return MAX_INTERVAL
+
+    observed = now - recent_crawls[-1]['crawled']
+    return max(MIN_INTERVAL, min(observed / productive / 2, MAX_INTERVAL))
+
+
+def respect_hints(now, next_crawl_at, hints, not_before):
+    """Pushes a crawl back until the feed's TTL, syndication period, and HTTP
+    caching headers say it could have changed, and out of any skipped hours or
+    days"""
+    earliest = [next_crawl_at]
+    if not_before:
+        earliest.append(not_before)
+    if ttl := hints.get('ttl'):
+        earliest.append(now + timedelta(minutes=ttl))
+    if update_interval := hints.get('update_interval'):
+        earliest.append(now + timedelta(seconds=update_interval))
+
+    next_crawl_at = min(max(earliest), now + MAX_HINTED_INTERVAL)
+
+    skip_hours = set(hints.get('skip_hours') or [])
+    skip_days = set(hints.get('skip_days') or [])
+    for _ in range(7 * 24):
+        if (
+            next_crawl_at.hour not in skip_hours
+            and next_crawl_at.strftime('%A') not in skip_days
+        ):
+            break
+        next_crawl_at = next_crawl_at.replace(minute=0, second=0, microsecond=0)
+        next_crawl_at += timedelta(hours=1)
+
+    return next_crawl_at
+
+
+def circuit_breaks(recent_crawls, breaks):
+    """Works out how many times in a row the feed's circuit breaker has tripped.
+    It trips once the feed has failed BREAKER_THRESHOLD times running, and then
+    again each time the crawl after a cooldown fails, until one succeeds."""
+    if not consecutive_failures(recent_crawls):
+        return 0
+    if breaks or consecutive_failures(recent_crawls) >= BREAKER_THRESHOLD:
+        return breaks + 1
+    return 0
+
+
+def cooldown(breaks):
+    """How long a feed is parked for after its breaker trips"""
+    steps = min(breaks - 1, MAX_BACKOFF_STEPS)
+    return min(BREAKER_COOLDOWN * 2**steps, MAX_BREAKER_COOLDOWN)
+
+
+def consecutive_failures(recent_crawls):
+    failures = 0
+    for crawl in recent_crawls:
+        if not failed(crawl['status']):
+            break
+        failures += 1
+    return failures
+
+
+def failed(status):
+    return status is None or not 200 <= status < 400
+
+
+async def reschedule(feed, not_before=None, db=None, unlogged=()):
+    """Schedules the next crawl of a feed from its recent crawls, including any
+    `unlogged` ones that haven't been written to the crawl_log yet"""
+    now = dates.utcnow()
+    async with database.connection(db) as db:
+        query = 'SELECT hints, circuit_breaks FROM subscriptions WHERE feed = $1'
+        subscription = await db.fetchrow(query, feed)
+        hints = json.loads(subscription['hints'] or '{}')
+
+        query = """
+        SELECT  crawled,
+                status,
+                new_entries
+        FROM    crawl_log
+        WHERE   feed = $1 AND
+                crawled >= $2
+        ORDER BY crawled DESC
+        """
+        recent_crawls = [
+            dict(row) for row in await db.fetch(query, feed, now - LOOKBACK)
+        ]
+        recent_crawls += [
+            {key: crawl[key] for key in ('crawled', 'status', 'new_entries')}
+            for crawl in unlogged
+            if crawl['crawled'] >= now - LOOKBACK
+        ]
+        recent_crawls.sort(key=lambda crawl: crawl['crawled'], reverse=True)
+
+        update = """
+        UPDATE  subscriptions
+        SET     next_crawl_at = $1,
+                circuit_breaks = $2,
+                lease_expires_at = NULL
+        WHERE   feed = $3
+        """
+        next_crawl_at = next_crawl(now, recent_crawls, hints, not_before)
+        breaks = circuit_breaks(recent_crawls, subscription['circuit_breaks'])
+        if breaks:
+            next_crawl_at = max(next_crawl_at, now + cooldown(breaks))
+        await db.execute(update, next_crawl_at, breaks, feed)
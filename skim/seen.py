@@ -0,0 +1,30 @@
+"""A compact memory of the entry ids each feed has already stored, so that a
+long-running crawler only asks the database about ids it hasn't seen before.
+The memory is a dict of feed URLs to sets of 64-bit digests of their ids."""
+import hashlib
+
+from skim import entries
+
+
+def digest(id):
+    return int.from_bytes(hashlib.blake2b(id.encode(), digest_size=8).digest(), 'big')
+
+
+async def unseen(known, feed, ids):
+    """Returns which of the given entry ids are not yet stored for the feed, like
+    entries.unseen, but only looking up the ids that aren't remembered"""
+    if feed not in known:
+        # the first crawl of a feed learns everything stored for it, which also
+        # answers this lookup
+        known[feed] = {digest(id) for id in await entries.ids(feed)}
+        return {id for id in ids if digest(id) not in known[feed]}
+
+    remembered = known[feed]
+    maybe_new = [id for id in ids if digest(id) not in remembered]
+    unseen = await entries.unseen(feed, maybe_new)
+    remember(known, feed, [id for id in maybe_new if id not in unseen])
+    return unseen
+
+
+def remember(known, feed, ids):
+    known.setdefault(feed, set()).update(digest(id) for id in ids)
@@ -6,7 +6,7 @@ from aiohttp import web
 from opentelemetry import trace
 from opentelemetry.semconv.trace import SpanAttributes
 
-from . import frontend
+from . import database, frontend
 
 tracer = trace.get_tracer(__name__)
 
@@ -29,13 +29,26 @@ def create_application():
         time_ago=frontend.time_ago,
         static_file=partial(frontend.static_file, app),
         crawl_sparkline=frontend.crawl_sparkline,
+        cursor=frontend.cursor,
     )
 
     app.add_routes(frontend.routes)
     app.add_routes(server_routes)
+
+    app.on_startup.append(open_database_pool)
+    app.on_cleanup.append(close_database_pool)
+
     return app
 
 
+async def open_database_pool(app: web.Application):
+    await database.open_pool()
+
+
+async def close_database_pool(app: web.Application):
+    await database.close_pool()
+
+
 @server_routes.get('/health')
 async def health(request: web.Request):
     return web.Response(status=204)
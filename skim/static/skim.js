@@ -1 +1,29 @@
-/**/
+document.documentElement.classList.replace('no-js', 'js');
+
+// The home page lists entries without their bodies, which are loaded as they
+// come close to being scrolled into view
+async function loadBody(element) {
+    const url = element.dataset.body;
+    delete element.dataset.body;
+
+    const response = await fetch(url);
+    if (response.ok) {
+        element.innerHTML = await response.text();
+    }
+}
+
+const bodyObserver = new IntersectionObserver(
+    (observed) => {
+        for (const { isIntersecting, target } of observed) {
+            if (isIntersecting && target.dataset.body) {
+                bodyObserver.unobserve(target);
+                loadBody(target);
+            }
+        }
+    },
+    { rootMargin: '200% 0px' },
+);
+
+for (const element of document.querySelectorAll('.article-body[data-body]')) {
+    bodyObserver.observe(element);
+}
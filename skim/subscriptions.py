@@ -1,11 +1,42 @@
 import json
+import os
+from datetime import timedelta
 
 from skim import database, dates
 
+# raw crawls are kept long enough for scheduling to look back over them, while
+# their hourly rollups are kept for much longer
+CRAWL_LOG_RETENTION = timedelta(
+    days=int(os.getenv('SKIM_CRAWL_LOG_RETENTION_DAYS') or '14')
+)
+ROLLUP_RETENTION = timedelta(
+    days=int(os.getenv('SKIM_CRAWL_ROLLUP_RETENTION_DAYS') or '365')
+)
+
+ROLLUP_COLUMNS = [
+    'hour',
+    'crawls',
+    'succeeded',
+    'unchanged',
+    'not_modified',
+    'failed',
+    'new_entries',
+    'max_new_entries',
+]
+
 
 async def all_subscriptions(lookback='14 day'):
+    """Yields every subscription along with an hourly summary of its crawls
+    over the `lookback`, read from the crawl_rollups rather than the raw log"""
     async with database.connection() as db:
         query = f"""
+        WITH hours AS (
+            SELECT  *
+            FROM    crawl_rollups
+            WHERE   (
+                hour >= date_trunc('day', current_timestamp - interval '{lookback}')
+            )
+        )
         SELECT  subscriptions.feed,
                 subscriptions.title,
                 subscriptions.site,
@@ -13,42 +44,25 @@ async def all_subscriptions(lookback='14 day'):
                 subscriptions.icon,
                 ARRAY_AGG(
                     ROW(
-                        crawls.crawled,
-                        crawls.status,
-                        crawls.new_entries
-                    )
-                ) AS recent_crawls,
-                SUM(crawls.new_entries) AS total_new_entries,
-                (
-                    SELECT MIN(crawled)
-                    FROM   crawl_log
-                    WHERE  (
-                        crawled >=
-                        date_trunc('day', current_timestamp - interval '{lookback}')
+                        hours.hour,
+                        hours.crawls,
+                        hours.succeeded,
+                        hours.unchanged,
+                        hours.not_modified,
+                        hours.failed,
+                        hours.new_entries,
+                        hours.max_new_entries
                     )
-                ) AS earliest_crawl,
+                    ORDER BY hours.hour
+                ) FILTER (WHERE hours.hour IS NOT NULL) AS recent_hours,
+                SUM(hours.new_entries) AS total_new_entries,
+                (SELECT MIN(hour) FROM hours) AS earliest_crawl,
                 (
                     SELECT percentile_disc(0.999) within group (order by new_entries)
-                    FROM   crawl_log
-                    WHERE  (
-                        crawled >=
-                        date_trunc('day', current_timestamp - interval '{lookback}')
-                    )
+                    FROM   hours
                 ) AS p95_new_entries
         FROM    subscriptions
-                LEFT JOIN (
-                    SELECT  feed,
-                            crawled,
-                            status,
-                            new_entries
-                    FROM    crawl_log
-                    WHERE   (
-                        crawled >=
-                        date_trunc('day', current_timestamp - interval '{lookback}')
-                    )
-                    ORDER BY feed, crawled
-                ) crawls
-                ON crawls.feed = subscriptions.feed
+                LEFT JOIN hours ON hours.feed = subscriptions.feed
         GROUP BY subscriptions.feed,
                 subscriptions.title,
                 subscriptions.site,
@@ -60,6 +74,45 @@ async def all_subscriptions(lookback='14 day'):
             yield subscription_from_row(row)
 
 
+async def metadata(feeds):
+    """Looks up just the titles, sites, and icons of the given feeds, keyed by
+    feed, for labeling their entries"""
+    async with database.connection() as db:
+        query = """
+        SELECT  feed,
+                title,
+                site,
+                icon
+        FROM    subscriptions
+        WHERE   feed = ANY($1::text[])
+        """
+        return {row['feed']: dict(row) for row in await db.fetch(query, list(feeds))}
+
+
+async def claim(limit, lease, now=None):
+    """Leases up to `limit` due subscriptions to this crawler, skipping any that
+    another crawler is holding an unexpired lease on.  Leases are released when
+    the feed is rescheduled, or expire if its crawler dies first."""
+    now = now or dates.utcnow()
+    async with database.connection() as db:
+        query = """
+        UPDATE  subscriptions
+        SET     lease_expires_at = $2
+        WHERE   feed IN (
+                    SELECT  feed
+                    FROM    subscriptions
+                    WHERE   (next_crawl_at IS NULL OR next_crawl_at <= $1) AND
+                            (lease_expires_at IS NULL OR lease_expires_at <= $1)
+                    ORDER BY next_crawl_at NULLS FIRST, feed
+                    LIMIT   $3
+                    FOR UPDATE SKIP LOCKED
+                )
+        RETURNING *
+        """
+        rows = await db.fetch(query, now, now + lease, limit)
+        return [subscription_from_row(row) for row in rows]
+
+
 async def add(feed):
     async with database.connection() as db:
         insert = """
@@ -75,21 +128,29 @@ async def get(feed):
         return subscription_from_row(row) if row else None
 
 
-async def update(feed, title=None, site=None, icon=None, caching=None):
-    async with database.connection() as db:
+async def update(
+    feed, title=None, site=None, icon=None, caching=None, hints=None, db=None
+):
+    async with database.connection(db) as db:
         query = """
         UPDATE subscriptions
         SET    title = $1,
                site = $2,
                icon = $3,
-               caching = $4
-        WHERE  feed = $5
+               caching = $4,
+               hints = $5
+        WHERE  feed = $6 AND
+               -- most crawls find a feed just as it was, and rewriting the
+               -- row anyway would only churn the table and the WAL
+               (title, site, icon, caching, hints) IS DISTINCT FROM
+               ($1, $2, $3, $4, $5)
         """
         parameters = [
             title,
             site,
             icon,
             json.dumps(caching) if caching else None,
+            json.dumps(hints) if hints else None,
             feed,
         ]
         await db.execute(query, *parameters)
@@ -105,31 +166,76 @@ def subscription_from_row(row):
     subscription = dict(row)
     if subscription['caching']:
         subscription['caching'] = json.loads(subscription['caching'])
-    if 'recent_crawls' in subscription:
-        crawls_columns = ['crawled', 'status', 'new_entries']
-        subscription['recent_crawls'] = [
-            dict(zip(crawls_columns, c)) for c in subscription['recent_crawls']
+    if subscription.get('hints'):
+        subscription['hints'] = json.loads(subscription['hints'])
+    if 'recent_hours' in subscription:
+        subscription['recent_hours'] = [
+            dict(zip(ROLLUP_COLUMNS, hour))
+            for hour in subscription['recent_hours'] or []
         ]
     return subscription
 
 
-async def log_crawl(feed, status=None, content_type=None, new_entries=None):
-    async with database.connection() as db:
+async def log_crawls(crawls, db=None):
+    """Records the outcomes of several crawls at once, adding them to the hourly
+    crawl_rollups as well"""
+    columns = ['feed', 'crawled', 'status', 'content_type', 'new_entries', 'unchanged']
+    rolled_up = ['feed', 'crawled', 'status', 'new_entries', 'unchanged']
+    async with database.connection(db) as db, db.transaction():
+        await db.copy_records_to_table(
+            'crawl_log',
+            records=[tuple(crawl[column] for column in columns) for crawl in crawls],
+            columns=columns,
+        )
+
         query = """
-        INSERT INTO crawl_log (
+        INSERT INTO crawl_rollups (
             feed,
-            crawled,
-            status,
-            content_type,
-            new_entries
+            hour,
+            crawls,
+            succeeded,
+            unchanged,
+            not_modified,
+            failed,
+            new_entries,
+            max_new_entries
         )
-        VALUES ($1, $2, $3, $4, $5)
+        SELECT  feed,
+                date_trunc('hour', crawled, 'UTC'),
+                COUNT(*),
+                COUNT(*) FILTER (
+                    WHERE status BETWEEN 200 AND 299 AND NOT unchanged
+                ),
+                COUNT(*) FILTER (WHERE status BETWEEN 200 AND 299 AND unchanged),
+                COUNT(*) FILTER (WHERE status BETWEEN 300 AND 399),
+                COUNT(*) FILTER (
+                    WHERE status IS NULL OR status NOT BETWEEN 200 AND 399
+                ),
+                COALESCE(SUM(new_entries), 0),
+                COALESCE(MAX(new_entries), 0)
+        FROM    unnest(
+                    $1::text[], $2::timestamptz[], $3::int[], $4::int[], $5::bool[]
+                ) AS crawls(feed, crawled, status, new_entries, unchanged)
+        GROUP BY feed, date_trunc('hour', crawled, 'UTC')
+        ON CONFLICT (feed, hour) DO UPDATE
+        SET     crawls = crawl_rollups.crawls + EXCLUDED.crawls,
+                succeeded = crawl_rollups.succeeded + EXCLUDED.succeeded,
+                unchanged = crawl_rollups.unchanged + EXCLUDED.unchanged,
+                not_modified = crawl_rollups.not_modified + EXCLUDED.not_modified,
+                failed = crawl_rollups.failed + EXCLUDED.failed,
+                new_entries = crawl_rollups.new_entries + EXCLUDED.new_entries,
+                max_new_entries = GREATEST(
+                    crawl_rollups.max_new_entries, EXCLUDED.max_new_entries
+                )
         """
-        parameters = [
-            feed,
-            dates.utcnow(),
-            status,
-            content_type,
-            new_entries,
-        ]
-        await db.execute(query, *parameters)
+        await db.execute(
+            query, *[[crawl[column] for crawl in crawls] for column in rolled_up]
+        )
+
+
+async def prune_crawls(before, rollups_before):
+    """Deletes the raw crawl_log rows from before `before`, and the (much
+    smaller) hourly rollups from before `rollups_before`"""
+    async with database.connection() as db, db.transaction():
+        await db.execute('DELETE FROM crawl_log WHERE crawled < $1', before)
+        await db.execute('DELETE FROM crawl_rollups WHERE hour < $1', rollups_before)
@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import asynccontextmanager
 from unittest import mock
 
 import pytest
@@ -8,8 +10,19 @@ from skim import database
 @pytest.fixture
 async def unmigrated_db():
     async with database.connection() as connection:
-        with mock.patch.object(database, 'connection') as connection_manager:
-            connection_manager.return_value.__aenter__.return_value = connection
+        # concurrent crawl workers all share this one connection, which can only
+        # run one operation at a time
+        in_use = asyncio.Lock()
+
+        @asynccontextmanager
+        async def shared_connection(db=None):
+            if db:
+                yield db
+                return
+            async with in_use:
+                yield connection
+
+        with mock.patch.object(database, 'connection', shared_connection):
             transaction = connection.transaction()
             await transaction.start()
             try:
@@ -1,11 +1,30 @@
 import asyncio
+import gzip
+import hashlib
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 from unittest import mock
 
+import brotli
 import pytest
+from aiohttp import ClientPayloadError, web
 from aioresponses import aioresponses
 from yarl import URL
 
-from skim import crawl, dates, parse, subscriptions
+from skim import (
+    crawl,
+    database,
+    dates,
+    entries,
+    normalize,
+    parse,
+    processing,
+    schedule,
+    subscriptions,
+)
 
 
 @pytest.fixture
@@ -13,39 +32,50 @@ async def one_subscription(skim_db):
     await subscriptions.add('https://example.com/1')
 
 
+@pytest.fixture
+async def session():
+    async with crawl.client_session() as session:
+        yield session
+
+
 @pytest.fixture
 async def two_subscriptions(one_subscription):
     await subscriptions.add('https://example.com/2')
 
 
+def rss_response(status=200):
+    return mock.Mock(status=status, content_type='application/rss+xml', headers={})
+
+
 async def test_crawl(two_subscriptions):
     crawl_time = dates.utcnow()
-    with mock.patch('skim.crawl.fetch') as fetch, mock.patch(
-        'skim.subscriptions.dates.utcnow'
-    ) as utcnow:
+    crawl_hour = crawl_time.replace(minute=0, second=0, microsecond=0)
+    with mock.patch('skim.crawl.download') as download, mock.patch(
+        'skim.crawl.parse_download'
+    ) as parse_download, mock.patch('skim.subscriptions.dates.utcnow') as utcnow:
         utcnow.return_value = crawl_time
         with mock.patch.object(crawl, 'MAX_CONCURRENT', 1):
-            fetch.side_effect = [
-                (
-                    'https://example.com/1',
-                    mock.Mock(status=200, content_type='application/rss+xml'),
-                    {'title': 'One'},
-                    [{'id': 'entry-one', 'title': 'Entry One'}],
-                ),
-                (
-                    'https://example.com/2',
-                    mock.Mock(status=200, content_type='application/rss+xml'),
-                    {'title': 'Two'},
-                    [{'id': 'entry-two', 'title': 'Entry Two'}],
-                ),
+            download.side_effect = [
+                ('https://example.com/1', rss_response(), b'<one/>'),
+                ('https://example.com/2', rss_response(), b'<two/>'),
+            ]
+            parse_download.side_effect = [
+                ({'title': 'One'}, [{'id': 'entry-one', 'title': 'Entry One'}]),
+                ({'title': 'Two'}, [{'id': 'entry-two', 'title': 'Entry Two'}]),
             ]
 
             await crawl.crawl()
 
-        fetch.assert_has_calls(
+        download.assert_has_calls(
+            [
+                mock.call(mock.ANY, 'https://example.com/1', caching=None),
+                mock.call(mock.ANY, 'https://example.com/2', caching=None),
+            ]
+        )
+        parse_download.assert_has_calls(
             [
-                mock.call('https://example.com/1', caching=None),
-                mock.call('https://example.com/2', caching=None),
+                mock.call(mock.ANY, b'<one/>', caching=None),
+                mock.call(mock.ANY, b'<two/>', caching=None),
             ]
         )
 
@@ -58,10 +88,19 @@ async def test_crawl(two_subscriptions):
                 'site': None,
                 'icon': None,
                 'caching': None,
-                'recent_crawls': [
-                    {'crawled': crawl_time, 'new_entries': 1, 'status': 200}
+                'recent_hours': [
+                    {
+                        'hour': crawl_hour,
+                        'crawls': 1,
+                        'succeeded': 1,
+                        'unchanged': 0,
+                        'not_modified': 0,
+                        'failed': 0,
+                        'new_entries': 1,
+                        'max_new_entries': 1,
+                    }
                 ],
-                'earliest_crawl': crawl_time,
+                'earliest_crawl': crawl_hour,
                 'p95_new_entries': 1,
                 'total_new_entries': 1,
             },
@@ -71,70 +110,472 @@ async def test_crawl(two_subscriptions):
                 'site': None,
                 'icon': None,
                 'caching': None,
-                'recent_crawls': [
-                    {'crawled': crawl_time, 'new_entries': 1, 'status': 200}
+                'recent_hours': [
+                    {
+                        'hour': crawl_hour,
+                        'crawls': 1,
+                        'succeeded': 1,
+                        'unchanged': 0,
+                        'not_modified': 0,
+                        'failed': 0,
+                        'new_entries': 1,
+                        'max_new_entries': 1,
+                    }
                 ],
-                'earliest_crawl': crawl_time,
+                'earliest_crawl': crawl_hour,
                 'p95_new_entries': 1,
                 'total_new_entries': 1,
             },
         }
 
+        # both feeds have been rescheduled for later
+        assert await subscriptions.claim(10, crawl.LEASE) == []
+
+
+async def logged_statuses():
+    query = """
+    SELECT  subscriptions.feed,
+            ARRAY_AGG(crawl_log.status ORDER BY crawl_log.crawled) AS statuses
+    FROM    subscriptions
+            LEFT JOIN crawl_log ON crawl_log.feed = subscriptions.feed
+    GROUP BY subscriptions.feed
+    """
+    async with database.connection() as db:
+        return {row['feed']: row['statuses'] for row in await db.fetch(query)}
+
+
+async def logged_crawls(feed):
+    query = """
+    SELECT  crawled, status, new_entries, unchanged
+    FROM    crawl_log
+    WHERE   feed = $1
+    ORDER BY crawled
+    """
+    async with database.connection() as db:
+        return [dict(row) for row in await db.fetch(query, feed)]
+
+
+async def crawl_one(session, subscription, known=None):
+    """Crawls a single feed through each of the stages of a crawl"""
+    remaining = [subscription]
+
+    async def next_subscription():
+        return remaining.pop() if remaining else None
+
+    await crawl.pipeline(session, next_subscription, known)
 
-async def test_crawl_fetch_errors(one_subscription):
-    with mock.patch('skim.crawl.fetch') as fetch, mock.patch(
-        'skim.crawl.subscriptions.log_crawl'
-    ) as log_crawl:
-        fetch.return_value = (
+
+async def test_crawl_refills_slots_without_waiting_on_slow_feeds(skim_db):
+    for i in range(3):
+        await subscriptions.add(f'https://example.com/{i}')
+
+    fetched = []
+    slowest_released = asyncio.Event()
+
+    async def download(session, feed_url, caching=None):
+        fetched.append(feed_url)
+        if len(fetched) == 1:
+            # the first feed can only finish once the other two have been fetched
+            # through the remaining slot
+            await asyncio.wait_for(slowest_released.wait(), timeout=1)
+        elif len(fetched) == 3:
+            slowest_released.set()
+        return feed_url, mock.Mock(status=304, headers={}), None
+
+    with mock.patch('skim.crawl.download', download):
+        with mock.patch.object(crawl, 'MAX_CONCURRENT', 2):
+            await crawl.crawl()
+
+    assert len(fetched) == 3
+    assert await logged_statuses() == {feed_url: [304] for feed_url in fetched}
+
+
+async def test_crawl_respects_caching_headers(one_subscription):
+    with mock.patch('skim.crawl.download') as download:
+        download.return_value = (
             'https://example.com/1',
-            mock.Mock(status=543, content_type='application/rss+xml'),
-            None,
+            mock.Mock(status=429, headers={'Retry-After': '7200'}),
             None,
         )
 
         await crawl.crawl()
 
-        fetch.assert_called_once_with('https://example.com/1', caching=None)
+    after = await subscriptions.get('https://example.com/1')
+    assert after['next_crawl_at'] >= dates.utcnow() + timedelta(hours=1, minutes=59)
+
+
+def downloaded(*guids):
+    """Fakes downloading and parsing a feed with entries for each of the guids"""
+    return (
+        ('https://example.com/1', rss_response(), b'<rss/>'),
+        (
+            {'title': 'One'},
+            [{'guid': guid, 'title': f'Entry {guid}'} for guid in guids],
+        ),
+    )
+
+
+async def test_crawl_one_only_normalizes_new_entries(one_subscription):
+    subscription = await subscriptions.get('https://example.com/1')
+
+    with mock.patch('skim.crawl.download') as download, mock.patch(
+        'skim.crawl.parse_download'
+    ) as parse_download, mock.patch(
+        'skim.normalize.entry', wraps=normalize.entry
+    ) as normalize_entry:
+        download.return_value, parse_download.return_value = downloaded('a', 'b')
+        await crawl_one(None, subscription)
+        assert normalize_entry.call_count == 2
+
+        normalize_entry.reset_mock()
+        download.return_value, parse_download.return_value = downloaded('a', 'b', 'c')
+        await crawl_one(None, subscription)
+        normalize_entry.assert_called_once_with({'guid': 'c', 'title': 'Entry c'})
+
+        normalize_entry.reset_mock()
+        await crawl_one(None, subscription)
+        normalize_entry.assert_not_called()
+
+    stored = [e['id'] async for e in entries.all_entries()]
+    assert sorted(stored) == ['a', 'b', 'c']
+
+
+async def test_crawl_one_remembers_seen_entries(one_subscription):
+    subscription = await subscriptions.get('https://example.com/1')
+    await entries.add(
+        'https://example.com/1',
+        id='a',
+        timestamp=datetime(2021, 2, 3, tzinfo=timezone.utc),
+        title='Entry a',
+    )
+
+    known: dict[str, set[int]] = {}
+    with mock.patch('skim.crawl.download') as download, mock.patch(
+        'skim.crawl.parse_download'
+    ) as parse_download, mock.patch(
+        'skim.entries.unseen', wraps=entries.unseen
+    ) as unseen:
+        download.return_value, parse_download.return_value = downloaded('a', 'b')
+        await crawl_one(None, subscription, known)
+        unseen.assert_not_called()
+
+        download.return_value, parse_download.return_value = downloaded('a', 'b', 'c')
+        await crawl_one(None, subscription, known)
+        unseen.assert_awaited_once_with('https://example.com/1', ['c'])
+
+    stored = [e['id'] async for e in entries.all_entries()]
+    assert sorted(stored) == ['a', 'b', 'c']
+
+
+@pytest.fixture
+def quick_retries():
+    with mock.patch.object(crawl, 'RETRY_DELAY', 0.001):
+        yield
+
+
+async def test_crawl_fetch_errors(one_subscription, quick_retries):
+    with mock.patch('skim.crawl.download') as download:
+        download.return_value = ('https://example.com/1', rss_response(543), None)
+
+        await crawl.crawl()
+
+        # server errors are retried
+        assert download.call_args_list == [
+            mock.call(mock.ANY, 'https://example.com/1', caching=None)
+        ] * (crawl.RETRIES + 1)
 
-        log_crawl.assert_called_once_with('https://example.com/1', status=543)
+    assert await logged_crawls('https://example.com/1') == [
+        {'crawled': mock.ANY, 'new_entries': None, 'status': 543, 'unchanged': False}
+    ]
 
 
-async def test_crawl_timeout(one_subscription):
-    with mock.patch('skim.crawl.fetch') as fetch, mock.patch(
-        'skim.crawl.subscriptions.log_crawl'
-    ) as log_crawl:
-        fetch.side_effect = asyncio.TimeoutError()
+async def test_crawl_timeout(one_subscription, quick_retries):
+    with mock.patch('skim.crawl.download') as download:
+        download.side_effect = asyncio.TimeoutError()
 
         await crawl.crawl()
 
-        fetch.assert_called_once_with('https://example.com/1', caching=None)
+        assert download.call_args_list == [
+            mock.call(mock.ANY, 'https://example.com/1', caching=None)
+        ] * (crawl.RETRIES + 1)
 
-        log_crawl.assert_called_once_with('https://example.com/1', status=-1)
+    assert await logged_statuses() == {'https://example.com/1': [-1]}
 
 
 async def test_crawl_parseerror(one_subscription):
-    with mock.patch('skim.crawl.fetch') as fetch, mock.patch(
-        'skim.crawl.subscriptions.log_crawl'
-    ) as log_crawl:
-        fetch.side_effect = parse.ParseError()
+    with mock.patch('skim.crawl.download') as download, mock.patch(
+        'skim.crawl.parse_download'
+    ) as parse_download:
+        download.return_value = ('https://example.com/1', rss_response(), b'nope')
+        parse_download.side_effect = parse.ParseError()
 
         await crawl.crawl()
 
-        fetch.assert_called_once_with('https://example.com/1', caching=None)
+        download.assert_called_once_with(
+            mock.ANY, 'https://example.com/1', caching=None
+        )
 
-        log_crawl.assert_called_once_with('https://example.com/1', status=-1)
+    assert await logged_statuses() == {'https://example.com/1': [-1]}
 
 
 async def test_crawl_unhandled(caplog, one_subscription):
-    with mock.patch('skim.crawl.fetch') as fetch:
-        fetch.side_effect = ValueError('This went poorly')
+    with mock.patch('skim.crawl.download') as download:
+        download.side_effect = ValueError('This went poorly')
 
         await crawl.crawl()
 
         assert 'This went poorly' in caplog.text
 
+    # the failure is logged and the feed rescheduled, releasing its lease
+    assert await logged_statuses() == {'https://example.com/1': [-1]}
+    subscription = await subscriptions.get('https://example.com/1')
+    assert subscription['next_crawl_at'] > dates.utcnow()
+    assert subscription['lease_expires_at'] is None
+
+
+async def test_crawl_unhandled_while_parsing(caplog, two_subscriptions):
+    with mock.patch('skim.crawl.download') as download, mock.patch(
+        'skim.crawl.parse_download'
+    ) as parse_download:
+        download.side_effect = [
+            ('https://example.com/1', rss_response(), b'<one/>'),
+            ('https://example.com/2', rss_response(), b'<two/>'),
+        ]
+        parse_download.side_effect = [
+            ValueError('This went poorly'),
+            ({'title': 'Two'}, []),
+        ]
+
+        with mock.patch.object(crawl, 'MAX_CONCURRENT', 1):
+            await crawl.crawl()
+
+    assert 'This went poorly' in caplog.text
+    assert await logged_statuses() == {
+        'https://example.com/1': [-1],
+        'https://example.com/2': [200],
+    }
+    assert await subscriptions.claim(10, crawl.LEASE) == []
+
+
+async def test_crawl_unhandled_while_saving(caplog, two_subscriptions):
+    add_many = entries.add_many
+
+    async def flaky_add_many(entries_by_feed, db=None):
+        if 'https://example.com/1' in entries_by_feed:
+            raise ValueError('This went poorly')
+        return await add_many(entries_by_feed, db=db)
+
+    batch = []
+    for feed_url in ['https://example.com/1', 'https://example.com/2']:
+        subscription = await subscriptions.get(feed_url)
+        with mock.patch('skim.crawl.download') as download, mock.patch(
+            'skim.crawl.parse_download'
+        ) as parse_download:
+            download.return_value = (feed_url, rss_response(), b'<rss/>')
+            parse_download.return_value = ({'title': feed_url}, [])
+            crawled = await crawl.download_feed(None, subscription)
+            await crawl.parse_feed(crawled)
+        batch.append(crawled)
+
+    with mock.patch('skim.entries.add_many', flaky_add_many):
+        await crawl.save_all(batch)
+
+    # the rest of the batch is saved without the feed that failed
+    assert 'This went poorly' in caplog.text
+    assert await logged_statuses() == {
+        'https://example.com/1': [None],
+        'https://example.com/2': [200],
+    }
+
+
+async def test_save_adds_entries_once_per_batch(two_subscriptions):
+    batch = []
+    for feed_url in ['https://example.com/1', 'https://example.com/2']:
+        subscription = await subscriptions.get(feed_url)
+        with mock.patch('skim.crawl.download') as download, mock.patch(
+            'skim.crawl.parse_download'
+        ) as parse_download:
+            download.return_value = (feed_url, rss_response(), b'<rss/>')
+            parse_download.return_value = (
+                {'title': feed_url},
+                [{'guid': 'a', 'title': 'Entry a'}],
+            )
+            crawled = await crawl.download_feed(None, subscription)
+            await crawl.parse_feed(crawled)
+        batch.append(crawled)
+
+    with mock.patch('skim.entries.add_many', wraps=entries.add_many) as add_many:
+        await crawl.save_all(batch)
+
+    add_many.assert_called_once()
+    assert [crawled['new_entries'] for crawled in batch] == [1, 1]
+
+
+async def test_crawl_one_unchanged(one_subscription):
+    subscription = await subscriptions.get('https://example.com/1')
+    with mock.patch('skim.crawl.download') as download, mock.patch(
+        'skim.crawl.parse_download'
+    ) as parse_download:
+        download.return_value = ('https://example.com/1', rss_response(), b'<rss/>')
+        parse_download.return_value = ({'skim:unchanged': True}, None)
+        await crawl_one(None, subscription)
 
-async def test_fetch():
+    assert await logged_crawls('https://example.com/1') == [
+        {'crawled': mock.ANY, 'new_entries': 0, 'status': 200, 'unchanged': True}
+    ]
+
+    # nothing about the feed itself was touched
+    assert (await subscriptions.get('https://example.com/1'))['caching'] is None
+
+
+@pytest.fixture
+async def many_subscriptions(skim_db):
+    feed_urls = [f'https://example.com/{i}' for i in range(10)]
+    for feed_url in feed_urls:
+        await subscriptions.add(feed_url)
+    return feed_urls
+
+
+async def unmodified(session, feed_url, caching=None):
+    return feed_url, mock.Mock(status=304, headers={}), None
+
+
+async def test_pipeline_batches_writes(many_subscriptions):
+    remaining = [{'feed': url, 'caching': None} for url in many_subscriptions]
+    batches = []
+    save_all = crawl.save_all
+
+    async def next_subscription():
+        return remaining.pop(0) if remaining else None
+
+    async def slow_save_all(batch, known=None, unlogged=None):
+        batches.append([crawled['feed_url'] for crawled in batch])
+        if len(batches) == 1:
+            # everything else piles up behind the first write
+            await asyncio.sleep(0.1)
+        await save_all(batch, known, unlogged)
+
+    with mock.patch('skim.crawl.download', unmodified), mock.patch(
+        'skim.crawl.save_all', slow_save_all
+    ), mock.patch.object(crawl, 'WRITE_BATCH_SIZE', 6), mock.patch.object(
+        crawl, 'queue_depth'
+    ) as queue_depth:
+        saved = mock.Mock()
+        await crawl.pipeline(None, next_subscription, saved=saved)
+
+    assert 1 < len(batches) < len(many_subscriptions)
+    assert max(len(batch) for batch in batches) == 6
+    assert sorted(sum(batches, [])) == sorted(many_subscriptions)
+    assert saved.call_args_list == [mock.call(len(batch)) for batch in batches]
+    assert await logged_statuses() == {url: [304] for url in many_subscriptions}
+
+    # every feed that waited on a stage was counted in and back out again
+    depths: dict[str, int] = {}
+    for (change, attributes), _ in queue_depth.add.call_args_list:
+        stage = attributes['crawl.stage']
+        depths[stage] = depths.get(stage, 0) + change
+    assert depths == {'parse': 0, 'save': 0}
+
+
+async def test_pipeline_applies_backpressure(many_subscriptions):
+    remaining = [{'feed': url, 'caching': None} for url in many_subscriptions]
+    downloaded = []
+    writable = asyncio.Event()
+    save_all = crawl.save_all
+
+    async def next_subscription():
+        return remaining.pop(0) if remaining else None
+
+    async def download(session, feed_url, caching=None):
+        downloaded.append(feed_url)
+        return await unmodified(session, feed_url, caching)
+
+    async def blocked_save_all(batch, known=None, unlogged=None):
+        await writable.wait()
+        await save_all(batch, known, unlogged)
+
+    with mock.patch('skim.crawl.download', download), mock.patch(
+        'skim.crawl.save_all', blocked_save_all
+    ), mock.patch.object(crawl, 'QUEUE_SIZE', 1), mock.patch.object(
+        crawl, 'MAX_CONCURRENT', 1
+    ):
+        crawling = asyncio.create_task(crawl.pipeline(None, next_subscription))
+        await asyncio.sleep(0.1)
+
+        # with the writer stuck, only a few feeds fit in the stages ahead of it
+        assert len(downloaded) < len(many_subscriptions)
+
+        writable.set()
+        await crawling
+
+    assert len(downloaded) == len(many_subscriptions)
+    assert await logged_statuses() == {url: [304] for url in many_subscriptions}
+
+
+async def test_pipeline_holds_back_crawl_log_rows(many_subscriptions):
+    remaining = [{'feed': url, 'caching': None} for url in many_subscriptions]
+    flushes = []
+    flush_crawl_log = crawl.flush_crawl_log
+
+    async def next_subscription():
+        return remaining.pop(0) if remaining else None
+
+    async def counted_flush_crawl_log(unlogged):
+        flushes.append(len(unlogged))
+        await flush_crawl_log(unlogged)
+
+    with mock.patch('skim.crawl.download', unmodified), mock.patch(
+        'skim.crawl.flush_crawl_log', counted_flush_crawl_log
+    ), mock.patch.object(crawl, 'WRITE_BATCH_SIZE', 1), mock.patch.object(
+        crawl, 'CRAWL_LOG_BATCH_SIZE', 4
+    ):
+        await crawl.pipeline(None, next_subscription)
+
+    # rows are written a few at a time, with whatever is left over at the end
+    assert flushes == [4, 4, 2]
+    assert await logged_statuses() == {url: [304] for url in many_subscriptions}
+
+
+async def test_pipeline_flushes_crawl_log_rows_after_a_while(two_subscriptions):
+    remaining = [
+        {'feed': 'https://example.com/1', 'caching': None},
+        {'feed': 'https://example.com/2', 'caching': None},
+    ]
+    logged_before_second = None
+
+    async def next_subscription():
+        nonlocal logged_before_second
+        if len(remaining) == 1:
+            # give the writer time to notice that its rows have waited too long
+            await asyncio.sleep(0.2)
+            logged_before_second = await logged_statuses()
+        return remaining.pop(0) if remaining else None
+
+    with mock.patch('skim.crawl.download', unmodified), mock.patch.object(
+        crawl, 'MAX_CONCURRENT', 1
+    ), mock.patch.object(crawl, 'CRAWL_LOG_INTERVAL', 0.05):
+        await crawl.pipeline(None, next_subscription)
+
+    assert logged_before_second == {
+        'https://example.com/1': [304],
+        'https://example.com/2': [None],
+    }
+    assert await logged_statuses() == {
+        'https://example.com/1': [304],
+        'https://example.com/2': [304],
+    }
+
+
+async def test_flush_crawl_log_keeps_rows_it_could_not_write(caplog, skim_db):
+    unlogged = [{'feed': 'https://example.com/1'}]
+    with mock.patch('skim.subscriptions.log_crawls', side_effect=ValueError('no')):
+        await crawl.flush_crawl_log(unlogged)
+
+    assert 'Unable to write 1 crawls' in caplog.text
+    assert unlogged == [{'feed': 'https://example.com/1'}]
+
+
+async def test_fetch(session):
     with aioresponses() as m:
         m.get(
             'https://example.com/1',
@@ -153,14 +594,16 @@ async def test_fetch():
             ''',
         )
 
-        feed_url, response, feed, entries = await crawl.fetch('https://example.com/1')
+        feed_url, response, feed, entries = await crawl.fetch(
+            session, 'https://example.com/1'
+        )
 
         assert feed_url == 'https://example.com/1'
         assert response.status == 200
         assert feed == {
             'title': 'Example!',
             'link': 'http://www.example.com',
-            'skim:caching': {},
+            'skim:caching': {'Body-Digest': mock.ANY},
             'skim:namespaces': {
                 'http://www.w3.org/2005/Atom': 'atom',
                 'http://purl.org/dc/elements/1.1/': 'dc',
@@ -169,11 +612,91 @@ async def test_fetch():
         assert entries == [{'description': 'Great stuff!', 'guid': 'abcdefg'}]
 
 
-async def test_fetch_sends_user_agent():
+async def test_fetch_skips_unchanged_bodies(session):
+    body = '''<?xml version="1.0"?>
+    <rss version="2.0">
+        <channel><title>Example!</title><item><guid>abcdefg</guid></item></channel>
+    </rss>
+    '''
+    with aioresponses() as m, mock.patch(
+        'skim.parse.parse_bytes', wraps=parse.parse_bytes
+    ) as parse_bytes:
+        for _ in range(3):
+            m.get(
+                'https://example.com/1',
+                headers={'Content-Type': 'application/rss+xml'},
+                body=body,
+            )
+
+        _, _, feed, _ = await crawl.fetch(session, 'https://example.com/1')
+        caching = feed['skim:caching']
+        assert caching == {'Body-Digest': hashlib.sha256(body.encode()).hexdigest()}
+        assert parse_bytes.call_count == 1
+
+        _, response, feed, entries = await crawl.fetch(
+            session, 'https://example.com/1', caching=caching
+        )
+        assert response.status == 200
+        assert feed == {'skim:unchanged': True}
+        assert entries is None
+        assert parse_bytes.call_count == 1
+
+        _, _, feed, _ = await crawl.fetch(
+            session, 'https://example.com/1', caching={'Body-Digest': 'different'}
+        )
+        assert feed['title'] == 'Example!'
+        assert parse_bytes.call_count == 2
+
+
+async def test_fetch_parses_unchanged_bodies_with_validators(session):
+    body = '<rss version="2.0"><channel><title>Example!</title></channel></rss>'
+    caching = {
+        'Etag': '"old"',
+        'Body-Digest': hashlib.sha256(body.encode()).hexdigest(),
+    }
+    with aioresponses() as m:
+        m.get(
+            'https://example.com/1',
+            headers={'Content-Type': 'application/rss+xml', 'Etag': '"new"'},
+            body=body,
+        )
+
+        _, _, feed, _ = await crawl.fetch(
+            session, 'https://example.com/1', caching=caching
+        )
+
+    # the server rotated its Etag, which has to be stored to get 304s again
+    assert feed['title'] == 'Example!'
+    assert feed['skim:caching'] == {**caching, 'Etag': '"new"'}
+
+
+async def test_fetch_parsing_in_another_process(session):
+    with aioresponses() as m, mock.patch.object(processing, 'PROCESSES', 1):
+        m.get(
+            'https://example.com/1',
+            headers={'Content-Type': 'application/rss+xml'},
+            body='''<?xml version="1.0"?>
+            <rss version="2.0">
+                <channel>
+                    <title>Example!</title>
+                    <item><guid>abcdefg</guid></item>
+                </channel>
+            </rss>
+            ''',
+        )
+
+        with processing.pool():
+            _, _, feed, entries = await crawl.fetch(session, 'https://example.com/1')
+
+        assert feed['title'] == 'Example!'
+        assert entries == [{'guid': 'abcdefg'}]
+
+
+async def test_fetch_sends_user_agent(session):
     with aioresponses() as m:
         m.get('https://example.com/1', status=304)
 
-        await crawl.fetch('https://example.com/1')
+        await crawl.fetch(session, 'https://example.com/1')
 
         request = m.requests[('GET', URL('https://example.com/1'))][0]
         sent_headers = request.kwargs['headers']
@@ -181,11 +704,12 @@ async def test_fetch_sends_user_agent():
         assert sent_headers['User-Agent'] == 'skim/0'
 
 
-async def test_fetch_sends_caching_headers():
+async def test_fetch_sends_caching_headers(session):
     with aioresponses() as m:
         m.get('https://example.com/1', status=304)
 
         await crawl.fetch(
+            session,
             'https://example.com/1',
             caching={'Etag': 'the-etag', 'Last-Modified': 'yesterday?'},
         )
@@ -197,7 +721,7 @@ async def test_fetch_sends_caching_headers():
         assert sent_headers['If-Modified-Since'] == 'yesterday?'
 
 
-async def test_fetch_handles_304_responses():
+async def test_fetch_handles_304_responses(session):
     with aioresponses() as m:
         m.get(
             'https://example.com/1',
@@ -206,6 +730,7 @@ async def test_fetch_handles_304_responses():
         )
 
         feed_url, response, feed, entries = await crawl.fetch(
+            session,
             'https://example.com/1',
             caching={'Etag': 'the-etag', 'Last-Modified': 'yesterday?'},
         )
@@ -216,7 +741,7 @@ async def test_fetch_handles_304_responses():
         assert entries is None
 
 
-async def test_fetch_error_status():
+async def test_fetch_error_status(session):
     with aioresponses() as m:
         m.get(
             'https://example.com/1',
@@ -225,9 +750,456 @@ async def test_fetch_error_status():
             body='any old thing',
         )
 
-        feed_url, response, feed, entries = await crawl.fetch('https://example.com/1')
+        feed_url, response, feed, entries = await crawl.fetch(
+            session, 'https://example.com/1'
+        )
 
         assert feed_url == 'https://example.com/1'
         assert response.status == 500
         assert feed is None
         assert entries is None
+
+
+def raw_deflate(body):
+    deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return deflate.compress(body) + deflate.flush()
+
+
+@pytest.mark.parametrize(
+    'encoding, compress',
+    [
+        (None, bytes),
+        ('identity', bytes),
+        ('gzip', gzip.compress),
+        ('deflate', zlib.compress),
+        ('deflate', raw_deflate),
+        ('br', brotli.compress),
+    ],
+)
+async def test_fetch_decompresses_bodies(session, encoding, compress):
+    body = b'''<?xml version="1.0"?>
+    <rss version="2.0">
+        <channel><title>Example!</title><item><guid>abcdefg</guid></item></channel>
+    </rss>
+    '''
+    wire = compress(body)
+    with aioresponses() as m, mock.patch.object(
+        crawl, 'READ_CHUNK_SIZE', 16
+    ), mock.patch.object(crawl, 'feed_bytes_received') as received, mock.patch.object(
+        crawl, 'feed_bytes_decoded'
+    ) as decoded:
+        m.get(
+            'https://example.com/1',
+            headers=crawl.only_set(
+                {'Content-Type': 'application/rss+xml', 'Content-Encoding': encoding}
+            ),
+            body=wire,
+        )
+
+        _, _, feed, entries = await crawl.fetch(session, 'https://example.com/1')
+
+        request = m.requests[('GET', URL('https://example.com/1'))][0]
+        assert request.kwargs['headers']['Accept-Encoding'] == 'gzip, deflate, br'
+
+    assert feed['title'] == 'Example!'
+    assert entries == [{'guid': 'abcdefg'}]
+    received.add.assert_called_once_with(
+        len(wire), {'feed.url': 'https://example.com/1'}
+    )
+    decoded.add.assert_called_once_with(
+        len(body), {'feed.url': 'https://example.com/1'}
+    )
+
+
+@pytest.mark.parametrize(
+    'encoding, wire', [('zstd', b'whatever'), ('gzip', b'not actually gzipped')]
+)
+async def test_fetch_undecodable_bodies(one_subscription, session, encoding, wire):
+    with aioresponses() as m:
+        m.get(
+            'https://example.com/1',
+            headers={
+                'Content-Type': 'application/rss+xml',
+                'Content-Encoding': encoding,
+            },
+            body=wire,
+        )
+
+        with pytest.raises(ClientPayloadError):
+            await crawl.fetch(session, 'https://example.com/1')
+
+        m.get(
+            'https://example.com/1',
+            headers={
+                'Content-Type': 'application/rss+xml',
+                'Content-Encoding': encoding,
+            },
+            body=wire,
+        )
+        subscription = await subscriptions.get('https://example.com/1')
+        await crawl_one(session, subscription)
+
+    (logged,) = await logged_crawls('https://example.com/1')
+    assert logged['status'] == -1
+
+
+async def test_client_session_connection_limits(session):
+    connector = session.connector
+    assert connector.limit == crawl.MAX_CONCURRENT
+    assert connector.limit_per_host == crawl.MAX_CONCURRENT_PER_HOST
+    assert connector.use_dns_cache
+
+
+def test_cacheable_until_max_age():
+    now = dates.utcnow()
+    headers = {
+        'Cache-Control': 'public, max-age=600',
+        'Expires': 'Wed, 21 Oct 2015 07:28:00 GMT',
+    }
+    assert crawl.cacheable_until(headers, now) == now + timedelta(minutes=10)
+
+
+def test_cacheable_until_expires():
+    now = datetime(2015, 10, 21, 7, 0, tzinfo=timezone.utc)
+    headers = {
+        'Cache-Control': 's-maxage=600',
+        'Expires': 'Wed, 21 Oct 2015 07:28:00 -0000',
+    }
+    assert crawl.cacheable_until(headers, now) == datetime(
+        2015, 10, 21, 7, 28, tzinfo=timezone.utc
+    )
+
+
+def test_cacheable_until_retry_after():
+    now = datetime(2015, 10, 21, 7, 0, tzinfo=timezone.utc)
+    assert crawl.cacheable_until(
+        {'Retry-After': '120', 'Cache-Control': 'max-age=60'}, now
+    ) == now + timedelta(minutes=2)
+    assert crawl.cacheable_until(
+        {'Retry-After': 'Wed, 21 Oct 2015 08:00:00 GMT'}, now
+    ) == datetime(2015, 10, 21, 8, 0, tzinfo=timezone.utc)
+
+
+def test_cacheable_until_nothing_useful():
+    now = dates.utcnow()
+    headers = {'Cache-Control': 'no-cache', 'Expires': '0', 'Retry-After': 'later'}
+    assert crawl.cacheable_until(headers, now) is None
+    assert crawl.cacheable_until({}, now) is None
+
+
+@pytest.fixture
+def quick_polls():
+    with mock.patch.object(crawl, 'POLL_INTERVAL', 0.01), mock.patch.object(
+        crawl, 'WEBHOOK_INTERVAL', 0
+    ):
+        yield
+
+
+async def test_crawl_continuously(two_subscriptions, quick_polls):
+    stopping = asyncio.Event()
+    fetched = []
+
+    async def download(session, feed_url, caching=None):
+        fetched.append(feed_url)
+        if feed_url == 'https://example.com/2':
+            # stays in flight across several polls, during which the webhook
+            # fires for the first feed
+            await asyncio.sleep(0.1)
+            stopping.set()
+        return feed_url, mock.Mock(status=304, headers={}), None
+
+    with mock.patch('skim.crawl.download', download), mock.patch(
+        'skim.crawl.post_crawl_webhook'
+    ) as post_crawl_webhook:
+        await asyncio.wait_for(crawl.crawl_continuously(stopping), timeout=5)
+
+    assert sorted(fetched) == ['https://example.com/1', 'https://example.com/2']
+    assert post_crawl_webhook.await_count == 2
+
+
+async def test_crawl_continuously_survives_webhook_errors(
+    caplog, two_subscriptions, quick_polls
+):
+    stopping = asyncio.Event()
+    fetched = []
+
+    async def download(session, feed_url, caching=None):
+        fetched.append(feed_url)
+        if feed_url == 'https://example.com/2':
+            await asyncio.sleep(0.1)
+            stopping.set()
+        return feed_url, mock.Mock(status=304, headers={}), None
+
+    with mock.patch('skim.crawl.download', download), mock.patch(
+        'skim.crawl.post_crawl_webhook'
+    ) as post_crawl_webhook:
+        post_crawl_webhook.side_effect = ConnectionRefusedError('Nobody home')
+        await asyncio.wait_for(crawl.crawl_continuously(stopping), timeout=5)
+
+    # the daemon kept crawling, and tried again once it was done
+    assert sorted(fetched) == ['https://example.com/1', 'https://example.com/2']
+    assert post_crawl_webhook.await_count == 2
+    assert 'Unable to post the crawl webhook' in caplog.text
+
+
+async def test_crawl_continuously_drains_on_stop(two_subscriptions, quick_polls):
+    stopping = asyncio.Event()
+    fetched = []
+
+    async def download(session, feed_url, caching=None):
+        fetched.append(feed_url)
+        stopping.set()
+        await asyncio.sleep(0.05)
+        return feed_url, mock.Mock(status=304, headers={}), None
+
+    with mock.patch('skim.crawl.download', download), mock.patch(
+        'skim.crawl.post_crawl_webhook'
+    ), mock.patch.object(crawl, 'MAX_CONCURRENT', 1):
+        await asyncio.wait_for(crawl.crawl_continuously(stopping), timeout=5)
+
+    # the feed in flight finished, the other was left for next time
+    assert len(fetched) == 1
+    assert len(await subscriptions.claim(10, crawl.LEASE)) == 1
+
+
+async def test_crawl_continuously_survives_errors(caplog, quick_polls):
+    stopping = asyncio.Event()
+    asyncio.get_running_loop().call_later(0.05, stopping.set)
+
+    with mock.patch('skim.crawl.subscriptions.claim') as claim, mock.patch(
+        'skim.crawl.subscriptions.prune_crawls'
+    ) as prune_crawls, mock.patch(
+        'skim.crawl.post_crawl_webhook'
+    ) as post_crawl_webhook, mock.patch.object(
+        crawl, 'PRUNE_INTERVAL', 0
+    ):
+        claim.side_effect = RuntimeError('Database went away')
+        prune_crawls.side_effect = RuntimeError('Database went away')
+        await asyncio.wait_for(crawl.crawl_continuously(stopping), timeout=5)
+
+    assert 'Unable to claim the feeds that are due' in caplog.text
+    assert 'Unable to prune the crawl history' in caplog.text
+    post_crawl_webhook.assert_not_awaited()
+
+
+async def test_post_crawl_webhook():
+    with aioresponses() as m, mock.patch.dict(
+        'os.environ', {'SKIM_POST_CRAWL_WEBHOOK': 'https://example.com/hook'}
+    ):
+        m.get('https://example.com/hook', status=204)
+
+        await crawl.post_crawl_webhook()
+
+        assert ('GET', URL('https://example.com/hook')) in m.requests
+
+
+async def test_post_crawl_webhook_unset():
+    with aioresponses() as m, mock.patch.dict('os.environ'):
+        os.environ.pop('SKIM_POST_CRAWL_WEBHOOK', None)
+
+        await crawl.post_crawl_webhook()
+
+        assert not m.requests
+
+
+@pytest.fixture
+async def stub_feeds(aiohttp_server):
+    """A local feed server, which replies to each request with the next of the
+    (status, headers) responses queued up for it"""
+    responses: list[tuple[int, dict[str, str]]] = []
+    requests: list[float] = []
+
+    async def feed(request):
+        requests.append(time.monotonic())
+        status, headers = responses.pop(0)
+        if status != 200:
+            return web.Response(status=status, headers=headers)
+        return web.Response(
+            headers=headers,
+            content_type='application/rss+xml',
+            body=b"""<?xml version="1.0"?>
+            <rss version="2.0">
+                <channel><title>Stub</title><item><guid>1</guid></item></channel>
+            </rss>
+            """,
+        )
+
+    app = web.Application()
+    app.router.add_get('/feed', feed)
+    server = await aiohttp_server(app)
+    return SimpleNamespace(
+        url=str(server.make_url('/feed')), responses=responses, requests=requests
+    )
+
+
+async def test_fetch_retries_server_errors(session, stub_feeds, quick_retries):
+    stub_feeds.responses.extend([(503, {}), (502, {}), (200, {})])
+
+    _, response, body = await crawl.fetch_with_retries(session, stub_feeds.url)
+
+    assert response.status == 200
+    assert b'<title>Stub</title>' in body
+    assert len(stub_feeds.requests) == 3
+
+
+async def test_fetch_gives_up_after_retrying(session, stub_feeds, quick_retries):
+    stub_feeds.responses.extend([(500, {})] * (crawl.RETRIES + 1))
+
+    _, response, body = await crawl.fetch_with_retries(session, stub_feeds.url)
+
+    assert response.status == 500
+    assert body is None
+    assert len(stub_feeds.requests) == crawl.RETRIES + 1
+
+
+async def test_fetch_does_not_retry_other_errors(session, stub_feeds, quick_retries):
+    stub_feeds.responses.append((404, {}))
+
+    _, response, _ = await crawl.fetch_with_retries(session, stub_feeds.url)
+
+    assert response.status == 404
+    assert len(stub_feeds.requests) == 1
+
+
+async def test_fetch_retries_when_told_to(session, stub_feeds):
+    soon = dates.utcnow() + timedelta(seconds=1)
+    stub_feeds.responses.extend(
+        [
+            (429, {'Retry-After': '0'}),
+            (503, {'Retry-After': soon.strftime('%a, %d %b %Y %H:%M:%S GMT')}),
+            (200, {}),
+        ]
+    )
+
+    _, response, _ = await crawl.fetch_with_retries(session, stub_feeds.url)
+
+    assert response.status == 200
+    first, second, third = stub_feeds.requests
+    assert second - first < 0.5
+    assert third - second > 0.1
+
+
+async def test_fetch_leaves_distant_retries_to_the_schedule(session, stub_feeds):
+    stub_feeds.responses.append((503, {'Retry-After': '3600'}))
+
+    _, response, _ = await crawl.fetch_with_retries(session, stub_feeds.url)
+
+    assert response.status == 503
+    assert len(stub_feeds.requests) == 1
+    assert crawl.cacheable_until(response.headers, dates.utcnow()) > dates.utcnow()
+
+
+async def test_fetch_retries_timeouts(session, quick_retries):
+    downloaded = ('https://example.com/1', mock.Mock(status=200), b'')
+    with mock.patch('skim.crawl.download') as download:
+        download.side_effect = [asyncio.TimeoutError(), downloaded]
+        assert await crawl.fetch_with_retries(session, 'https://example.com/1') == (
+            downloaded
+        )
+    assert download.call_count == 2
+
+
+def test_backoff_is_jittered_and_bounded():
+    delays = [crawl.backoff(3) for _ in range(100)]
+    assert all(0 <= delay <= crawl.RETRY_DELAY * 8 for delay in delays)
+    assert len(set(delays)) > 1
+    assert crawl.backoff(100) <= crawl.MAX_RETRY_DELAY
+
+
+async def test_host_limiter():
+    limiter = crawl.host_limiter(rate=20, burst=2)
+    (wait_for_a_token,) = limiter.on_request_start
+
+    async def request(host):
+        params = SimpleNamespace(url=URL(f'https://{host}/feed'))
+        await wait_for_a_token(None, None, params)
+        return time.monotonic()
+
+    started = time.monotonic()
+    times = [await request('example.com') for _ in range(4)]
+    other_host = await request('example.org')
+
+    # the first two go right away as a burst, then one every 1/20th of a second
+    assert times[1] - started < 0.04
+    assert times[2] - started >= 0.04
+    assert times[3] - started >= 0.09
+    assert other_host - times[3] < 0.04
+
+
+async def test_client_session_without_host_limits():
+    with mock.patch.object(crawl, 'HOST_RATE', 0):
+        async with crawl.client_session() as session:
+            assert not any(config.on_request_start for config in session.trace_configs)
+
+
+@pytest.fixture
+async def slow_feeds(aiohttp_server):
+    """A local feed server which trickles out its feed a byte at a time, after
+    a slow redirect to it, or all at once from /fast"""
+
+    async def trickle(request):
+        response = web.StreamResponse(headers={'Content-Type': 'application/rss+xml'})
+        await response.prepare(request)
+        # the client always gives up on this before it ends
+        while True:
+            await response.write(b' ')
+            await asyncio.sleep(0.05)
+
+    async def slow_redirect(request):
+        await asyncio.sleep(0.2)
+        raise web.HTTPFound('/feed')
+
+    async def fast(request):
+        return web.Response(content_type='application/rss+xml', body=b'<rss/>')
+
+    app = web.Application()
+    app.router.add_get('/feed', trickle)
+    app.router.add_get('/redirect', slow_redirect)
+    app.router.add_get('/fast', fast)
+    server = await aiohttp_server(app)
+    return server.make_url
+
+
+async def test_fetch_gives_up_on_trickling_feeds(slow_feeds):
+    with mock.patch.object(crawl, 'TOTAL_TIMEOUT', 0.2):
+        async with crawl.client_session() as session:
+            # each read arrives well within the read timeout, but the whole of
+            # the feed takes too long, whether on a new or a reused connection
+            for _ in range(2):
+                started = time.monotonic()
+                with pytest.raises(asyncio.TimeoutError):
+                    await crawl.download(session, str(slow_feeds('/feed')))
+                assert time.monotonic() - started < 0.5
+
+
+async def test_fetch_deadline_covers_redirects(slow_feeds):
+    with mock.patch.object(crawl, 'TOTAL_TIMEOUT', 0.3):
+        async with crawl.client_session() as session:
+            started = time.monotonic()
+            with pytest.raises(asyncio.TimeoutError):
+                await crawl.download(session, str(slow_feeds('/redirect')))
+
+            # the clock wasn't started over for the redirected request
+            assert time.monotonic() - started < 0.45
+
+
+async def test_requests_without_a_deadline(slow_feeds):
+    async with crawl.client_session() as session:
+        async with session.get(slow_feeds('/fast')) as response:
+            assert await response.read() == b'<rss/>'
+
+
+async def test_persistently_failing_feeds_are_parked(
+    skim_db, session, stub_feeds, quick_retries
+):
+    await subscriptions.add(stub_feeds.url)
+    stub_feeds.responses.extend([(500, {})] * (crawl.RETRIES + 1) * 2)
+
+    with mock.patch.object(schedule, 'BREAKER_THRESHOLD', 2):
+        for _ in range(2):
+            subscription = await subscriptions.get(stub_feeds.url)
+            await crawl_one(session, subscription)
+
+    parked = await subscriptions.get(stub_feeds.url)
+    assert parked['circuit_breaks'] == 1
+    assert parked['next_crawl_at'] >= dates.utcnow() + schedule.BREAKER_COOLDOWN / 2
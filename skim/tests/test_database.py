@@ -0,0 +1,38 @@
+import os
+from unittest import mock
+
+from skim import database
+
+
+async def test_pooled_connections():
+    async with database.pool():
+        pool = await database.open_pool()
+        assert await database.open_pool() is pool
+
+        async with database.connection() as db:
+            assert await db.fetchval('SELECT 1;') == 1
+
+    assert not database._pool
+
+    # closing an already-closed pool is harmless
+    await database.close_pool()
+
+
+async def test_sharing_a_connection():
+    async with database.connection() as db:
+        async with database.connection(db) as shared:
+            assert shared is db
+
+
+def test_pool_parameters_from_environment():
+    environment = {
+        'SKIM_DB_POOL_MIN_SIZE': '2',
+        'SKIM_DB_POOL_MAX_SIZE': '20',
+        'SKIM_DB_POOL_IDLE_TIMEOUT': '60',
+    }
+    with mock.patch.dict(os.environ, environment):
+        assert database.pool_parameters() == {
+            'min_size': 2,
+            'max_size': 20,
+            'max_inactive_connection_lifetime': 60.0,
+        }
@@ -2,7 +2,7 @@ from datetime import datetime, timedelta, timezone
 
 import pytest
 
-from skim import entries
+from skim import dates, entries
 
 
 async def test_entries_nonexisting(skim_db):
@@ -92,30 +92,31 @@ async def test_adding_multiple_is_idempotent(skim_db):
     assert 'test-id-1' not in before
     assert 'test-id-2' not in before
 
+    timestamp = dates.utcnow() - timedelta(days=1)
     new_entries = [
         dict(
             id='test-id-1',
-            timestamp=datetime(2021, 2, 3, 4, 5, 6, tzinfo=timezone.utc),
+            timestamp=timestamp,
             title='Test Entry',
             link='https://example.com/1',
             body='Hiiiii',
         ),
         dict(
             id='test-id-2',
-            timestamp=datetime(2021, 2, 3, 4, 5, 6, tzinfo=timezone.utc),
+            timestamp=timestamp,
             title='Test Entry',
             link='https://example.com/1',
             body='Hiiiii',
         ),
     ]
 
-    await entries.add_all('https://example.com/feed', new_entries)
+    assert await entries.add_all('https://example.com/feed', new_entries) == 2
 
     after = [e['id'] async for e in entries.all_entries()]
     assert 'test-id-1' in after
     assert 'test-id-2' in after
 
-    await entries.add_all('https://example.com/feed', new_entries)
+    assert await entries.add_all('https://example.com/feed', new_entries) == 0
     final = [e['id'] async for e in entries.all_entries()]
     assert 'test-id-1' in final
     assert 'test-id-2' in final
@@ -123,6 +124,78 @@ async def test_adding_multiple_is_idempotent(skim_db):
     assert len(after) == len(final)
 
 
+async def test_adding_multiple_with_creators_and_categories(skim_db):
+    timestamp = dates.utcnow() - timedelta(days=1)
+    new_entries = [
+        dict(
+            id='test-id-1',
+            timestamp=timestamp,
+            title='Test Entry',
+            link='https://example.com/1',
+            body='Hiiiii',
+            creators=['Jane', 'John'],
+            categories=['Cool'],
+        ),
+        dict(
+            id='test-id-2',
+            timestamp=timestamp,
+            title='Test Entry',
+            link='https://example.com/2',
+            body='Hiiiii',
+            creators=None,
+            categories=['Cool', 'Stuff'],
+        ),
+    ]
+
+    assert await entries.add_all('https://example.com/feed', new_entries) == 2
+
+    after = {e['id']: e async for e in entries.all_entries()}
+    assert after['test-id-1']['creators'] == {'Jane', 'John'}
+    assert after['test-id-1']['categories'] == {'Cool'}
+    assert after['test-id-2']['creators'] == set()
+    assert after['test-id-2']['categories'] == {'Cool', 'Stuff'}
+
+
+async def test_adding_nothing(skim_db):
+    assert await entries.add_all('https://example.com/feed', []) == 0
+
+
+async def test_unseen(skim_db):
+    await entries.add(
+        'https://example.com/feed',
+        id='seen',
+        timestamp=datetime(2021, 2, 3, 4, 5, 6, tzinfo=timezone.utc),
+        title='Test Entry',
+    )
+
+    unseen = await entries.unseen('https://example.com/feed', ['seen', 'new'])
+    assert unseen == {'new'}
+
+    assert await entries.unseen('https://example.com/feed', []) == set()
+
+
+async def test_adding_many(skim_db):
+    timestamp = dates.utcnow() - timedelta(days=1)
+
+    def entry(id):
+        return dict(id=id, timestamp=timestamp, title=id, link=None, body=None)
+
+    await entries.add('https://example.com/A', **entry('seen'))
+
+    new_entries = await entries.add_many(
+        {
+            'https://example.com/A': [entry('seen'), entry('new')],
+            'https://example.com/B': [entry('seen'), entry('new')],
+            'https://example.com/C': [],
+        }
+    )
+    assert new_entries == {
+        'https://example.com/A': 1,
+        'https://example.com/B': 2,
+        'https://example.com/C': 0,
+    }
+
+
 @pytest.fixture
 async def filterable_entries(skim_db):
     new = datetime(2021, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
@@ -198,3 +271,238 @@ async def test_entries_older_than_by_multiple(filterable_entries):
     }
     older = [e['id'] async for e in entries.older_than(datetime(2021, 2, 3), filters)]
     assert older == ['old-one']
+
+
+async def test_entries_older_than_position_breaks_ties(skim_db):
+    timestamp = datetime(2021, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+    for feed in ['https://example.com/A', 'https://example.com/B']:
+        for id in ['one', 'two']:
+            await entries.add(feed, id=id, timestamp=timestamp, title='Same time')
+
+    first = [
+        e
+        async for e in entries.older_than(
+            datetime.max.replace(tzinfo=timezone.utc), {}, limit=3
+        )
+    ]
+    assert [(e['feed'], e['id']) for e in first] == [
+        ('https://example.com/B', 'two'),
+        ('https://example.com/B', 'one'),
+        ('https://example.com/A', 'two'),
+    ]
+
+    position = entries.position(first[-1])
+    rest = [e async for e in entries.older_than(position, {}, limit=3)]
+    assert [(e['feed'], e['id']) for e in rest] == [('https://example.com/A', 'one')]
+
+
+async def test_entries_older_than_keeps_every_creator_and_category(
+    filterable_entries,
+):
+    filters = {'category': 'Neat'}
+    older = [e async for e in entries.older_than(datetime(2021, 2, 3), filters)]
+    assert len(older) == 1
+    assert older[0]['creators'] == {'Jane'}
+    assert older[0]['categories'] == {'Neat', 'Stuff'}
+
+
+async def test_entries_older_than_position_within_a_filter(skim_db):
+    timestamp = datetime(2021, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+    for feed in ['https://example.com/A', 'https://example.com/B']:
+        for id in ['one', 'two']:
+            await entries.add(
+                feed,
+                id=id,
+                timestamp=timestamp,
+                title='Same time',
+                creators=['Jane'] if id == 'one' else ['John'],
+                categories=['Cool'],
+            )
+
+    filters = {'creator': 'Jane', 'category': 'Cool'}
+    first = [
+        e
+        async for e in entries.older_than(
+            datetime.max.replace(tzinfo=timezone.utc), filters, limit=1
+        )
+    ]
+    assert [(e['feed'], e['id']) for e in first] == [('https://example.com/B', 'one')]
+
+    position = entries.position(first[-1])
+    rest = [e async for e in entries.older_than(position, filters)]
+    assert [(e['feed'], e['id']) for e in rest] == [('https://example.com/A', 'one')]
+
+
+@pytest.fixture
+async def searchable_entries(skim_db):
+    timestamp = datetime(2021, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+    for i, (title, body) in enumerate(
+        [
+            ('Gardening', '<p>Tomatoes need a lot of sun</p>'),
+            ('Tomatoes', '<p>All about <strong>tomatoes</strong></p>'),
+            ('Cooking', '<p>A sauce made from a tomato</p>'),
+            ('Baking', '<p>Bread, <em>strong</em> flour, no fruit</p>'),
+        ]
+    ):
+        await entries.add(
+            'https://example.com/feed',
+            id=f'entry-{i}',
+            timestamp=timestamp - timedelta(hours=i),
+            title=title,
+            body=body,
+            creators=['Jane'] if i % 2 else ['John'],
+        )
+
+
+async def test_entries_search_ranks_by_relevance(searchable_entries):
+    found = [
+        e['id']
+        async for e in entries.older_than(
+            datetime.max.replace(tzinfo=timezone.utc), {'q': 'tomatoes'}
+        )
+    ]
+    assert found == ['entry-1', 'entry-0', 'entry-2']
+
+
+async def test_entries_search_ignores_markup(searchable_entries):
+    found = [
+        e['id']
+        async for e in entries.older_than(
+            datetime.max.replace(tzinfo=timezone.utc), {'q': 'strong'}
+        )
+    ]
+    assert found == ['entry-3']
+
+
+async def test_entries_search_with_filters(searchable_entries):
+    filters = {'q': 'tomato', 'creator': 'John'}
+    found = [
+        e['id']
+        async for e in entries.older_than(
+            datetime.max.replace(tzinfo=timezone.utc), filters
+        )
+    ]
+    assert found == ['entry-0', 'entry-2']
+
+
+async def test_entries_search_pages_by_rank(searchable_entries):
+    filters = {'q': 'tomato'}
+    first = [
+        e
+        async for e in entries.older_than(
+            datetime.max.replace(tzinfo=timezone.utc), filters, limit=2
+        )
+    ]
+    assert [e['id'] for e in first] == ['entry-1', 'entry-0']
+    assert first[0]['rank'] > first[1]['rank']
+
+    position = entries.position(first[-1])
+    assert len(position) == 4
+    rest = [e['id'] async for e in entries.older_than(position, filters)]
+    assert rest == ['entry-2']
+
+
+async def test_entries_older_than_without_bodies(filterable_entries):
+    older = [
+        e async for e in entries.older_than(datetime(2021, 2, 3), {}, bodies=False)
+    ]
+    assert [e['id'] for e in older] == ['old-one', 'another-one']
+    assert all('body' not in e for e in older)
+
+
+async def test_entry_body(filterable_entries):
+    assert await entries.body('https://example.com/feed/B', 'old-one') == 'Hiiiii #1'
+
+
+async def test_entry_body_missing(filterable_entries):
+    assert await entries.body('https://example.com/feed/B', 'nope') is None
+
+
+async def test_entry_body_empty(skim_db):
+    await entries.add(
+        'https://example.com/feed',
+        id='bodiless',
+        timestamp=datetime(2021, 2, 3, tzinfo=timezone.utc),
+        title='Hi',
+    )
+    assert await entries.body('https://example.com/feed', 'bodiless') == ''
+
+
+async def test_adding_an_id_again_at_another_time(skim_db):
+    feed = 'https://example.com/feed'
+    first = dates.utcnow() - timedelta(days=90)
+    assert await entries.add(feed, id='moving', timestamp=first, title='First')
+    assert not await entries.add(
+        feed, id='moving', timestamp=first + timedelta(days=60), title='Later'
+    )
+
+    new_entries = [
+        dict(id='twice', timestamp=first, title='One', link=None, body=None),
+        dict(id='twice', timestamp=first, title='Two', link=None, body=None),
+    ]
+    assert await entries.add_all(feed, new_entries) == 1
+
+    stored = [(e['id'], e['title']) async for e in entries.all_entries()]
+    assert stored == [('twice', 'One'), ('moving', 'First')]
+
+
+async def test_adding_entries_from_pruned_months(skim_db):
+    feed = 'https://example.com/feed'
+
+    def entry(id, timestamp):
+        return dict(id=id, timestamp=timestamp, title=id, link=None, body=None)
+
+    pruned = entry('pruned', datetime(2020, 3, 5, tzinfo=timezone.utc))
+    archived = entry('archived', datetime(2020, 1, 5, tzinfo=timezone.utc))
+    recent = entry('recent', dates.utcnow() - timedelta(days=1))
+
+    await entries.add_all(feed, [pruned])
+    assert await entries.prune(datetime(2020, 4, 15, tzinfo=timezone.utc)) == [
+        datetime(2020, 3, 1, tzinfo=timezone.utc)
+    ]
+
+    # old entries are stored as long as their month hasn't been pruned away
+    assert await entries.add_all(feed, [pruned, archived, recent]) == 2
+    stored = [e['id'] async for e in entries.all_entries()]
+    assert stored == ['recent', 'archived']
+
+    # and the pruned entry's month isn't brought back for it
+    query = 'SELECT to_regclass($1) IS NULL'
+    assert await skim_db.fetchval(query, 'entries_y2020m03')
+
+
+def test_month():
+    assert entries.month(
+        datetime(2021, 3, 1, 1, tzinfo=timezone(timedelta(hours=5)))
+    ) == datetime(2021, 2, 1, tzinfo=timezone.utc)
+
+
+async def test_pruning(skim_db):
+    for i, timestamp in enumerate(
+        [
+            datetime(2020, 12, 31, 23, 59, tzinfo=timezone.utc),
+            datetime(2021, 1, 15, tzinfo=timezone.utc),
+            datetime(2021, 2, 1, tzinfo=timezone.utc),
+        ]
+    ):
+        await entries.add(
+            'https://example.com/feed',
+            id=f'entry-{i}',
+            timestamp=timestamp,
+            title='Test Entry',
+            creators=['Jane'],
+            categories=['Cool'],
+        )
+
+    dropped = await entries.prune(datetime(2021, 2, 15, tzinfo=timezone.utc))
+    assert dropped == [
+        datetime(2020, 12, 1, tzinfo=timezone.utc),
+        datetime(2021, 1, 1, tzinfo=timezone.utc),
+    ]
+
+    remaining = [e async for e in entries.all_entries()]
+    assert [e['id'] for e in remaining] == ['entry-2']
+    assert remaining[0]['creators'] == {'Jane'}
+    assert remaining[0]['categories'] == {'Cool'}
+
+    assert await entries.prune(datetime(2021, 2, 15, tzinfo=timezone.utc)) == []
@@ -46,6 +46,46 @@ async def test_get_home(client, a_subscription, some_entries):
     ]
 
 
+async def test_get_home_labels_entries_with_their_feeds(
+    client, a_subscription, some_entries
+):
+    await subscriptions.update('https://example.com/feed', title='The Feed')
+
+    with mock.patch.object(subscriptions, 'all_subscriptions') as all_subscriptions:
+        response = await client.get('/')
+
+    # the home page doesn't pay for the crawl history of every subscription
+    all_subscriptions.assert_not_called()
+    soup = BeautifulSoup(await response.text(), 'html.parser')
+    feed_links = soup.select('article header > a[href^="?feed="]')
+    assert [a.text for a in feed_links] == ['The Feed'] * 3
+
+
+async def test_get_home_loads_bodies_separately(client, a_subscription, skim_db):
+    await entries.add(
+        'https://example.com/feed',
+        id='an id & more',
+        title='Entry',
+        timestamp=datetime(2021, 1, 2, tzinfo=timezone.utc),
+        body='<p>The <em>whole</em> thing</p>',
+    )
+
+    response = await client.get('/')
+    soup = BeautifulSoup(await response.text(), 'html.parser')
+    (article_body,) = soup.select('article .article-body')
+    assert 'whole' not in article_body.text
+
+    response = await client.get(article_body['data-body'])
+    assert response.status == 200
+    assert response.headers['Content-Type'] == 'text/html; charset=utf-8'
+    assert await response.text() == '<p>The <em>whole</em> thing</p>'
+
+
+async def test_get_missing_body(client, a_subscription, some_entries):
+    response = await client.get('/entries/body?feed=https://example.com/feed&id=no')
+    assert response.status == 404
+
+
 async def test_get_home_second_page(client, a_subscription, some_entries):
     response = await client.get('/?older-than=2021-01-02T05:00:00Z')
     assert response.status == 200
@@ -56,6 +96,78 @@ async def test_get_home_second_page(client, a_subscription, some_entries):
     assert entry_links == ['https://example.com/1', 'https://example.com/0']
 
 
+async def test_get_home_pages_by_cursor(client, a_subscription, some_entries):
+    with mock.patch.object(frontend, 'PAGE_SIZE', 2):
+        response = await client.get('/')
+        soup = BeautifulSoup(await response.text(), 'html.parser')
+        entry_links = [a['href'] for a in soup.select('article h1 a[href]')]
+        assert entry_links == ['https://example.com/2', 'https://example.com/1']
+
+        keep_going = soup.select('nav a')[-1]['href']
+        response = await client.get('/' + keep_going)
+        soup = BeautifulSoup(await response.text(), 'html.parser')
+        entry_links = [a['href'] for a in soup.select('article h1 a[href]')]
+        assert entry_links == ['https://example.com/0']
+
+
+@pytest.mark.parametrize(
+    'cursor',
+    [
+        'junk',
+        'WzEsIDJd',
+        'WyJub3QgYSBkYXRlIiwgImEiLCAiYiJd',
+        'e30=',
+        'WzEsIDIsICIyMDIxLTAxLTAyIiwgImEiLCAiYiJd',
+    ],
+)
+async def test_redirect_on_bad_cursor(client, a_subscription, some_entries, cursor):
+    response = await client.get(f'/?after={cursor}', allow_redirects=False)
+    assert response.status == 302
+    assert response.headers['Location'] == '/'
+
+
+def test_cursors_round_trip():
+    entry = {
+        'timestamp': datetime(2021, 1, 2, 3, 4, 5, 6, tzinfo=timezone.utc),
+        'feed': 'https://example.com/feed',
+        'id': 'an id',
+    }
+    assert frontend.from_cursor(frontend.cursor(entry)) == entries.position(entry)
+
+
+def test_cursors_round_trip_with_rank():
+    entry = {
+        'rank': 0.25,
+        'timestamp': datetime(2021, 1, 2, 3, 4, 5, 6, tzinfo=timezone.utc),
+        'feed': 'https://example.com/feed',
+        'id': 'an id',
+    }
+    assert frontend.from_cursor(frontend.cursor(entry)) == entries.position(entry)
+
+
+async def test_searching_home(client, a_subscription, some_entries):
+    await entries.add(
+        'https://example.com/feed',
+        id='searchable',
+        title='Something about tomatoes',
+        link='https://example.com/tomatoes',
+        timestamp=datetime(2021, 1, 1, tzinfo=timezone.utc),
+    )
+
+    with mock.patch.object(frontend, 'PAGE_SIZE', 1):
+        response = await client.get('/?q=tomato')
+        soup = BeautifulSoup(await response.text(), 'html.parser')
+        entry_links = [a['href'] for a in soup.select('article h1 a[href]')]
+        assert entry_links == ['https://example.com/tomatoes']
+        assert soup.select_one('form.search input')['value'] == 'tomato'
+
+        keep_going = soup.select('nav a')[-1]['href']
+        assert 'q=tomato' in keep_going
+        response = await client.get('/' + keep_going)
+        soup = BeautifulSoup(await response.text(), 'html.parser')
+        assert soup.select('article') == []
+
+
 async def test_redirect_on_bad_date(client, a_subscription, some_entries):
     response = await client.get('/?older-than=junk', allow_redirects=False)
     assert response.status == 302
@@ -160,40 +272,38 @@ async def test_list_hot_topics(client, mock_top_categories):
 
 async def test_sparklines():
     base_time = dates.utcnow()
+
+    def hour(hours, **counts):
+        return {
+            'hour': base_time + timedelta(hours=hours),
+            'crawls': 1,
+            'succeeded': 0,
+            'unchanged': 0,
+            'not_modified': 0,
+            'failed': 0,
+            'new_entries': 0,
+            'max_new_entries': 0,
+            **counts,
+        }
+
     sparkline = frontend.crawl_sparkline(
         {
             "earliest_crawl": base_time,
             "p95_new_entries": 3,
-            "recent_crawls": [
-                {
-                    "crawled": base_time + timedelta(seconds=1),
-                    "new_entries": 1,
-                    "status": 200,
-                },
-                {
-                    "crawled": base_time + timedelta(seconds=2),
-                    "new_entries": 0,
-                    "status": 304,
-                },
-                {
-                    "crawled": base_time + timedelta(seconds=3),
-                    "new_entries": 0,
-                    "status": -1,
-                },
-                {
-                    "crawled": base_time + timedelta(seconds=4),
-                    "new_entries": 0,
-                    "status": 404,
-                },
-                {
-                    "crawled": None,
-                    "new_entries": None,
-                    "status": None,
-                },
+            "recent_hours": [
+                hour(0, succeeded=1, new_entries=1, max_new_entries=1),
+                hour(1, not_modified=1),
+                hour(2, unchanged=1),
+                hour(3, crawls=2, succeeded=1, failed=1),
+                hour(4, failed=1),
             ],
         }
     )
     assert isinstance(sparkline, Markup)
     assert sparkline.startswith("<svg")
 
+    # one line for each hour, red only for the hour where every crawl failed
+    assert sparkline.count('<line') == 5
+    assert sparkline.count('stroke="red"') == 1
+
     # TODO: more tests here
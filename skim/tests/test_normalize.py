@@ -16,6 +16,7 @@ def test_feed_empty():
         'site': None,
         'icon': None,
         'caching': None,
+        'hints': None,
     }
 
 
@@ -32,6 +33,7 @@ def test_feed_basics():
         'site': 'https://example.com/1',
         'icon': 'https://example.com/logo.png',
         'caching': None,
+        'hints': None,
     }
 
 
@@ -48,6 +50,7 @@ def test_feed_detailed_icon():
         'site': 'https://example.com/1',
         'icon': 'https://example.com/logo.png',
         'caching': None,
+        'hints': None,
     }
 
 
@@ -64,9 +67,42 @@ def test_feed_detailed_icon_not_a_string_or_dict():
         'site': 'https://example.com/1',
         'icon': None,
         'caching': None,
+        'hints': None,
     }
 
 
+def test_feed_hints():
+    normalized = normalize.feed(
+        {
+            'title': 'The Title',
+            'ttl': '60',
+            'skipHours': {'hour': ['0', '1', 'nope']},
+            'skipDays': {'day': 'saturday'},
+            'syn:updatePeriod': 'daily ',
+            'syn:updateFrequency': '4',
+            'skim:namespaces': {
+                'http://purl.org/rss/1.0/modules/syndication/': 'syn',
+            },
+        }
+    )
+    assert normalized['hints'] == {
+        'ttl': 60,
+        'skip_hours': [0, 1],
+        'skip_days': ['Saturday'],
+        'update_interval': 21600,
+    }
+
+
+def test_feed_hints_syndication_defaults():
+    normalized = normalize.feed({'sy:updatePeriod': 'hourly', 'skipHours': ''})
+    assert normalized['hints'] == {'update_interval': 3600}
+
+
+def test_feed_hints_unrecognized():
+    normalized = normalize.feed({'ttl': 'soon', 'sy:updatePeriod': 'fortnightly'})
+    assert normalized['hints'] is None
+
+
 @mock.patch('skim.dates.utcnow', return_value=FROZEN_NOW)
 def test_entry_empty(utcnow):
     normalized = normalize.entry({})
@@ -276,6 +312,7 @@ def test_embedding_empty_enclosure():
     )
     assert normalized['body'] == '<p>\n Hello, world!\n</p>'
 
+
 def test_embedding_unrecognized_media_type():
     normalized = normalize.entry(
         {
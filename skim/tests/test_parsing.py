@@ -1,6 +1,5 @@
 import json
 import os
-import tempfile
 
 import aiofiles
 import pytest
@@ -28,7 +27,7 @@ async def test_parsing_standard_examples(example, content_type):
         expected = json.loads(await file.read())
 
     async with aiofiles.open(example_filename, 'rb') as file:
-        feed, entries = await parse.parse(content_type, 'utf-8', file)
+        feed, entries = parse.parse_bytes(content_type, 'utf-8', await file.read())
 
     assert feed == expected['feed']
     assert entries == expected['entries']
@@ -52,7 +51,7 @@ async def test_parsing_standard_examples_generic_xml_type(example):
         expected = json.loads(await file.read())
 
     async with aiofiles.open(example_filename, 'rb') as file:
-        feed, entries = await parse.parse('text/xml', 'utf-8', file)
+        feed, entries = parse.parse_bytes('text/xml', 'utf-8', await file.read())
 
     assert feed == expected['feed']
     assert entries == expected['entries']
@@ -74,79 +73,59 @@ async def test_parsing_examples_from_the_wild(example, content_type):
         expected = json.loads(await file.read())
 
     async with aiofiles.open(example_filename, 'rb') as file:
-        feed, entries = await parse.parse(content_type, 'utf-8', file)
+        feed, entries = parse.parse_bytes(content_type, 'utf-8', await file.read())
 
     assert feed == expected['feed']
     assert entries == expected['entries']
 
 
-async def test_raises_for_unknown_content_type():
+def test_raises_for_unknown_content_type():
     with pytest.raises(NotImplementedError):
-        await parse.parse('text/plain', 'utf-8', None)
-
-
-async def test_handles_empty_feed_document():
-    with tempfile.NamedTemporaryFile('w') as weird_file:
-        weird_file.write('')
-        weird_file.flush()
-
-        async with aiofiles.open(weird_file.name, 'r') as stream:
-            feed, entries = await parse.parse('application/rss+xml', 'utf-8', stream)
-
-        assert not feed
-        assert not entries
-
-
-async def test_raises_for_unrecognized_xml_document():
-    with tempfile.NamedTemporaryFile('w') as weird_file:
-        weird_file.write('<wat></wat>')
-        weird_file.flush()
-
-        async with aiofiles.open(weird_file.name, 'rb') as stream:
-            with pytest.raises(NotImplementedError):
-                await parse.parse('text/xml', 'utf-8', stream)
-
-
-async def test_handles_empty_xml_document():
-    with tempfile.NamedTemporaryFile('w') as weird_file:
-        weird_file.write('')
-        weird_file.flush()
-
-        async with aiofiles.open(weird_file.name, 'r') as stream:
-            feed, entries = await parse.parse('text/xml', 'utf-8', stream)
-
-        assert not feed
-        assert not entries
-
-
-async def test_handles_single_item_feed():
-    with tempfile.NamedTemporaryFile('w') as single_entry:
-        single_entry.write(
-            """<?xml version="1.0"?>
-        <rss version="2.0">
-            <channel>
-                <title>Example!</title>
-                <link>http://www.example.com</link>
-                <item>
-                    <description>Great stuff!</description>
-                    <guid>abcdefg</guid>
-                </item>
-            </channel>
-        </rss>
-        """
-        )
-        single_entry.flush()
-
-        async with aiofiles.open(single_entry.name, 'rb') as stream:
-            feed, entries = await parse.parse('application/rss+xml', 'utf-8', stream)
-
-        assert feed == {
-            'title': 'Example!',
-            'link': 'http://www.example.com',
-            'skim:namespaces': {
-                'http://purl.org/dc/elements/1.1/': 'dc',
-                'http://www.w3.org/2005/Atom': 'atom',
-            },
-        }
-        assert isinstance(entries, list)
-        assert entries == [{'description': 'Great stuff!', 'guid': 'abcdefg'}]
+        parse.parse_bytes('text/plain', 'utf-8', b'')
+
+
+def test_handles_empty_feed_document():
+    feed, entries = parse.parse_bytes('application/rss+xml', 'utf-8', b'')
+
+    assert not feed
+    assert not entries
+
+
+def test_raises_for_unrecognized_xml_document():
+    with pytest.raises(NotImplementedError):
+        parse.parse_bytes('text/xml', 'utf-8', b'<wat></wat>')
+
+
+def test_handles_empty_xml_document():
+    feed, entries = parse.parse_bytes('text/xml', 'utf-8', b'')
+
+    assert not feed
+    assert not entries
+
+
+def test_handles_single_item_feed():
+    body = b"""<?xml version="1.0"?>
+    <rss version="2.0">
+        <channel>
+            <title>Example!</title>
+            <link>http://www.example.com</link>
+            <item>
+                <description>Great stuff!</description>
+                <guid>abcdefg</guid>
+            </item>
+        </channel>
+    </rss>
+    """
+
+    feed, entries = parse.parse_bytes('application/rss+xml', 'utf-8', body)
+
+    assert feed == {
+        'title': 'Example!',
+        'link': 'http://www.example.com',
+        'skim:namespaces': {
+            'http://purl.org/dc/elements/1.1/': 'dc',
+            'http://www.w3.org/2005/Atom': 'atom',
+        },
+    }
+    assert isinstance(entries, list)
+    assert entries == [{'description': 'Great stuff!', 'guid': 'abcdefg'}]
@@ -0,0 +1,23 @@
+import os
+from unittest import mock
+
+from skim import processing
+
+
+async def test_running_without_a_pool():
+    with mock.patch.object(processing, 'PROCESSES', 0):
+        with processing.pool():
+            assert await processing.run(os.getpid) == os.getpid()
+
+
+async def test_running_in_a_pool():
+    with mock.patch.object(processing, 'PROCESSES', 1):
+        with processing.pool():
+            # opening the pool again while it's open reuses it
+            with processing.pool():
+                worker_pid = await processing.run(os.getpid)
+
+            assert worker_pid != os.getpid()
+            assert await processing.run(os.getpid) == worker_pid
+
+    assert await processing.run(os.getpid) == os.getpid()
@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta, timezone
+
+from skim import dates, schedule, subscriptions
+
+NOW = dates.utcnow()
+
+
+def crawls(*crawls):
+    return [
+        {'crawled': NOW - age, 'status': status, 'new_entries': new_entries}
+        for age, status, new_entries in crawls
+    ]
+
+
+def test_never_crawled():
+    assert schedule.next_crawl(NOW, []) == NOW + schedule.MAX_INTERVAL
+
+
+def test_nothing_new():
+    recent = crawls(
+        (timedelta(hours=1), 304, None),
+        (timedelta(hours=2), 200, 0),
+    )
+    assert schedule.next_crawl(NOW, recent) == NOW + schedule.MAX_INTERVAL
+
+
+def test_busy_feeds_are_crawled_more_often():
+    recent = crawls(
+        (timedelta(hours=2), 200, 3),
+        (timedelta(hours=4), 304, None),
+        (timedelta(hours=6), 200, 1),
+        (timedelta(hours=8), 200, 2),
+    )
+    # 3 productive crawls over 8 hours, crawled twice as often as that
+    assert schedule.next_crawl(NOW, recent) == NOW + timedelta(hours=8) / 3 / 2
+
+
+def test_very_busy_feeds_are_limited_to_the_minimum_interval():
+    recent = crawls(
+        (timedelta(minutes=1), 200, 3),
+        (timedelta(minutes=2), 200, 3),
+    )
+    assert schedule.next_crawl(NOW, recent) == NOW + schedule.MIN_INTERVAL
+
+
+def test_failures_back_off_exponentially():
+    recent = crawls(
+        (timedelta(hours=1), -1, None),
+        (timedelta(hours=2), 503, None),
+        (timedelta(hours=3), 200, 4),
+    )
+    assert schedule.next_crawl(NOW, recent) == NOW + schedule.MIN_INTERVAL * 4
+
+
+def test_failures_back_off_to_the_maximum_interval():
+    recent = crawls(*[(timedelta(hours=i), 500, None) for i in range(100)])
+    assert schedule.next_crawl(NOW, recent) == NOW + schedule.MAX_INTERVAL
+
+
+def test_circuit_breaker_trips_after_enough_failures():
+    failing = crawls(
+        *[(timedelta(hours=i), 500, None) for i in range(schedule.BREAKER_THRESHOLD)]
+    )
+    assert schedule.circuit_breaks(failing[1:], 0) == 0
+    assert schedule.circuit_breaks(failing, 0) == 1
+
+
+def test_circuit_breaker_trips_again_until_a_success():
+    assert schedule.circuit_breaks(crawls((timedelta(hours=1), -1, None)), 3) == 4
+    assert schedule.circuit_breaks(crawls((timedelta(hours=1), 304, None)), 3) == 0
+
+
+def test_circuit_breaker_cooldowns_grow_exponentially():
+    assert schedule.cooldown(1) == schedule.BREAKER_COOLDOWN
+    assert schedule.cooldown(3) == schedule.BREAKER_COOLDOWN * 4
+    assert schedule.cooldown(1000) == schedule.MAX_BREAKER_COOLDOWN
+
+
+def test_hints_ttl_and_update_interval():
+    hints = {'ttl': 120, 'update_interval': 3 * 3600}
+    assert schedule.next_crawl(NOW, [], hints) == NOW + schedule.MAX_INTERVAL
+
+    recent = crawls((timedelta(minutes=1), 200, 3))
+    assert schedule.next_crawl(NOW, recent, {'ttl': 120}) == NOW + timedelta(hours=2)
+    assert schedule.next_crawl(NOW, recent, hints) == NOW + timedelta(hours=3)
+
+
+def test_hints_not_before():
+    recent = crawls((timedelta(minutes=1), 200, 3))
+    later = NOW + timedelta(hours=5)
+    assert schedule.next_crawl(NOW, recent, not_before=later) == later
+
+
+def test_hints_are_limited():
+    far_future = NOW + timedelta(days=365)
+    assert (
+        schedule.next_crawl(NOW, [], not_before=far_future)
+        == NOW + schedule.MAX_HINTED_INTERVAL
+    )
+
+
+def test_hints_skip_hours_and_days():
+    now = datetime(2022, 10, 14, 22, 30, tzinfo=timezone.utc)  # a Friday
+    recent = [{'crawled': now, 'status': 200, 'new_entries': 1}]
+    hints = {'skip_hours': [22, 23], 'skip_days': ['Saturday']}
+    assert schedule.next_crawl(now, recent, hints) == datetime(
+        2022, 10, 16, 0, 0, tzinfo=timezone.utc
+    )
+
+
+def test_hints_skipping_everything():
+    recent = crawls((timedelta(minutes=1), 200, 3))
+    hints = {'skip_hours': list(range(24))}
+    assert schedule.next_crawl(NOW, recent, hints) > NOW + timedelta(days=6)
+
+
+async def log_crawl(feed, status, new_entries=None):
+    crawl = {
+        'feed': feed,
+        'crawled': dates.utcnow(),
+        'status': status,
+        'content_type': None,
+        'new_entries': new_entries,
+        'unchanged': False,
+    }
+    await subscriptions.log_crawls([crawl])
+
+
+async def test_rescheduling(skim_db):
+    await subscriptions.add('https://example.com/1')
+    await log_crawl('https://example.com/1', status=500)
+
+    await schedule.reschedule('https://example.com/1')
+
+    after = await subscriptions.get('https://example.com/1')
+    assert after['next_crawl_at'] > dates.utcnow() + schedule.MIN_INTERVAL
+
+
+async def test_rescheduling_respects_hints(skim_db):
+    await subscriptions.add('https://example.com/1')
+    await subscriptions.update('https://example.com/1', hints={'ttl': 600})
+    await log_crawl('https://example.com/1', status=200, new_entries=5)
+
+    not_before = dates.utcnow() + timedelta(hours=11)
+    await schedule.reschedule('https://example.com/1', not_before=not_before)
+
+    after = await subscriptions.get('https://example.com/1')
+    assert after['next_crawl_at'] == not_before
+
+
+async def test_rescheduling_parks_and_releases_failing_feeds(skim_db):
+    await subscriptions.add('https://example.com/1')
+    for _ in range(schedule.BREAKER_THRESHOLD):
+        await log_crawl('https://example.com/1', status=500)
+
+    await schedule.reschedule('https://example.com/1')
+    parked = await subscriptions.get('https://example.com/1')
+    assert parked['circuit_breaks'] == 1
+    assert parked[
+        'next_crawl_at'
+    ] >= dates.utcnow() + schedule.BREAKER_COOLDOWN - timedelta(minutes=1)
+
+    await log_crawl('https://example.com/1', status=500)
+    await schedule.reschedule('https://example.com/1')
+    parked = await subscriptions.get('https://example.com/1')
+    assert parked['circuit_breaks'] == 2
+    assert parked[
+        'next_crawl_at'
+    ] >= dates.utcnow() + schedule.BREAKER_COOLDOWN * 2 - timedelta(minutes=1)
+
+    await log_crawl('https://example.com/1', status=200)
+    await schedule.reschedule('https://example.com/1')
+    released = await subscriptions.get('https://example.com/1')
+    assert released['circuit_breaks'] == 0
@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+
+from skim import entries, seen
+
+
+@pytest.fixture
+async def some_entries(skim_db):
+    for id in ['one', 'two']:
+        await entries.add(
+            'https://example.com/feed',
+            id=id,
+            timestamp=datetime(2021, 2, 3, tzinfo=timezone.utc),
+            title='Test Entry',
+        )
+
+
+def test_digests_are_stable_and_small():
+    assert seen.digest('an id') == seen.digest('an id')
+    assert seen.digest('an id') != seen.digest('another id')
+    assert 0 <= seen.digest('an id') < 2**64
+
+
+async def test_first_lookup_learns_the_feed(some_entries):
+    known: dict[str, set[int]] = {}
+    unseen = await seen.unseen(known, 'https://example.com/feed', ['one', 'three'])
+    assert unseen == {'three'}
+    assert known['https://example.com/feed'] == {
+        seen.digest('one'),
+        seen.digest('two'),
+    }
+
+
+async def test_only_unremembered_ids_are_looked_up(some_entries):
+    known = {'https://example.com/feed': {seen.digest('one')}}
+    with mock.patch('skim.entries.unseen', wraps=entries.unseen) as unseen:
+        found = await seen.unseen(
+            known, 'https://example.com/feed', ['one', 'two', 'three']
+        )
+    assert found == {'three'}
+    unseen.assert_awaited_once_with('https://example.com/feed', ['two', 'three'])
+
+    # ids the database knew about are remembered from then on
+    assert seen.digest('two') in known['https://example.com/feed']
+    assert seen.digest('three') not in known['https://example.com/feed']
+
+
+def test_remembering():
+    known: dict[str, set[int]] = {}
+    seen.remember(known, 'https://example.com/feed', ['one'])
+    seen.remember(known, 'https://example.com/feed', ['two'])
+    assert known == {
+        'https://example.com/feed': {seen.digest('one'), seen.digest('two')}
+    }
@@ -1,4 +1,6 @@
-from skim import subscriptions
+from datetime import timedelta
+
+from skim import dates, schedule, subscriptions
 
 
 async def test_subscriptions_management(skim_db):
@@ -25,6 +27,23 @@ async def test_subscriptions_management(skim_db):
     assert 'https://example.com' not in after
 
 
+async def test_subscriptions_metadata(skim_db):
+    await subscriptions.add('https://example.com/1')
+    await subscriptions.add('https://example.com/2')
+    await subscriptions.update('https://example.com/1', title='One', site='a site')
+
+    feeds = ['https://example.com/1', 'https://example.com/nope']
+    assert await subscriptions.metadata(feeds) == {
+        'https://example.com/1': {
+            'feed': 'https://example.com/1',
+            'title': 'One',
+            'site': 'a site',
+            'icon': None,
+        }
+    }
+    assert await subscriptions.metadata([]) == {}
+
+
 async def test_subscriptions_updating_data(skim_db):
     await subscriptions.add('https://example.com')
     await subscriptions.update('https://example.com', title='Example!')
@@ -39,3 +58,158 @@ async def test_subscriptions_updating_caching(skim_db):
     )
     after = await subscriptions.get('https://example.com')
     assert after['caching'] == {'Etag': 'foo', 'Last-Modified': 'bar'}
+
+
+async def test_subscriptions_updating_hints(skim_db):
+    await subscriptions.add('https://example.com')
+    await subscriptions.update('https://example.com', hints={'ttl': 60})
+    after = await subscriptions.get('https://example.com')
+    assert after['hints'] == {'ttl': 60}
+
+
+async def test_subscriptions_updating_unchanged_data(skim_db):
+    await subscriptions.add('https://example.com')
+    await subscriptions.update('https://example.com', title='Example!', hints={})
+    query = 'SELECT ctid FROM subscriptions WHERE feed = $1'
+    before = await skim_db.fetchval(query, 'https://example.com')
+
+    await subscriptions.update('https://example.com', title='Example!', hints={})
+
+    # the row wasn't rewritten, so it's still the same version of it
+    assert await skim_db.fetchval(query, 'https://example.com') == before
+
+
+async def test_subscriptions_claiming_due(skim_db):
+    now = dates.utcnow()
+    await subscriptions.add('https://example.com/never-crawled')
+    await subscriptions.add('https://example.com/due')
+    await subscriptions.add('https://example.com/not-due')
+
+    update = 'UPDATE subscriptions SET next_crawl_at = $1 WHERE feed = $2'
+    await skim_db.execute(update, now - timedelta(minutes=1), 'https://example.com/due')
+    await skim_db.execute(
+        update, now + timedelta(minutes=1), 'https://example.com/not-due'
+    )
+
+    due = [s['feed'] for s in await subscriptions.claim(5, timedelta(minutes=5), now)]
+    assert due == ['https://example.com/never-crawled', 'https://example.com/due']
+
+
+async def test_subscriptions_claiming(skim_db):
+    now = dates.utcnow()
+    lease = timedelta(minutes=5)
+    for i in range(3):
+        await subscriptions.add(f'https://example.com/{i}')
+
+    first = await subscriptions.claim(2, lease, now)
+    second = await subscriptions.claim(2, lease, now)
+    assert sorted(s['feed'] for s in first) == [
+        'https://example.com/0',
+        'https://example.com/1',
+    ]
+    assert [s['feed'] for s in second] == ['https://example.com/2']
+    assert await subscriptions.claim(2, lease, now) == []
+
+    # leases left behind by a crawler that went away eventually expire
+    later = now + lease + timedelta(seconds=1)
+    reclaimed = await subscriptions.claim(5, lease, later)
+    assert len(reclaimed) == 3
+
+
+async def test_subscriptions_rescheduling_releases_lease(skim_db):
+    now = dates.utcnow()
+    await subscriptions.add('https://example.com/1')
+    await subscriptions.claim(1, timedelta(minutes=5), now)
+
+    await schedule.reschedule('https://example.com/1')
+
+    after = await subscriptions.get('https://example.com/1')
+    assert after['lease_expires_at'] is None
+    assert after['next_crawl_at'] > now
+
+
+def crawled(feed, when, status=200, new_entries=0, unchanged=False):
+    return {
+        'feed': feed,
+        'crawled': when,
+        'status': status,
+        'content_type': None,
+        'new_entries': new_entries,
+        'unchanged': unchanged,
+    }
+
+
+async def test_subscriptions_crawl_rollups(skim_db):
+    hour = dates.utcnow().replace(minute=0, second=0, microsecond=0)
+    earlier = hour - timedelta(hours=1)
+    await subscriptions.add('https://example.com')
+
+    await subscriptions.log_crawls(
+        [
+            crawled('https://example.com', earlier, new_entries=3),
+            crawled('https://example.com', earlier + timedelta(minutes=5), 304),
+            crawled('https://example.com', hour, new_entries=1),
+        ]
+    )
+    # later crawls in the same hour are added to what's already there
+    await subscriptions.log_crawls(
+        [
+            crawled('https://example.com', hour, new_entries=2),
+            crawled('https://example.com', hour, unchanged=True),
+            crawled('https://example.com', hour, None),
+            crawled('https://example.com', hour, 500),
+        ]
+    )
+
+    (subscription,) = [s async for s in subscriptions.all_subscriptions()]
+    assert subscription['earliest_crawl'] == earlier
+    assert subscription['total_new_entries'] == 6
+    assert subscription['recent_hours'] == [
+        {
+            'hour': earlier,
+            'crawls': 2,
+            'succeeded': 1,
+            'unchanged': 0,
+            'not_modified': 1,
+            'failed': 0,
+            'new_entries': 3,
+            'max_new_entries': 3,
+        },
+        {
+            'hour': hour,
+            'crawls': 5,
+            'succeeded': 2,
+            'unchanged': 1,
+            'not_modified': 0,
+            'failed': 2,
+            'new_entries': 3,
+            'max_new_entries': 2,
+        },
+    ]
+
+
+async def test_subscriptions_without_crawls(skim_db):
+    await subscriptions.add('https://example.com')
+
+    (subscription,) = [s async for s in subscriptions.all_subscriptions()]
+    assert subscription['recent_hours'] == []
+    assert subscription['earliest_crawl'] is None
+
+
+async def test_subscriptions_pruning_crawls(skim_db):
+    now = dates.utcnow()
+    await subscriptions.add('https://example.com')
+    await subscriptions.log_crawls(
+        [
+            crawled('https://example.com', now - timedelta(days=30)),
+            crawled('https://example.com', now - timedelta(days=3)),
+            crawled('https://example.com', now),
+        ]
+    )
+
+    await subscriptions.prune_crawls(now - timedelta(days=7), now - timedelta(days=5))
+
+    query = 'SELECT COUNT(*) FROM crawl_log'
+    assert await skim_db.fetchval(query) == 2
+    query = 'SELECT COUNT(*) FROM crawl_rollups'
+    assert await skim_db.fetchval(query) == 2